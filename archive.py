@@ -0,0 +1,122 @@
+import os
+import threading
+from log import print_error, print_warning
+from urls import extract_video_id
+
+ARCHIVE_FILE = os.path.expanduser("~/.config/YtDownloader/archive.txt")
+
+# Matches any format when importing archives that don't record one
+ANY_FORMAT = "*"
+
+def archive_key_for_url(url):
+    # Only derived from the URL so it can be checked before get_info runs
+    video_id = extract_video_id(url)
+    if video_id is None:
+        return None
+    return "youtube", video_id
+
+class DownloadArchive:
+    """Append-only record of finished downloads.
+
+    Each line is "<extractor> <video id> <video|audio> <format id>". The
+    file is read once into a set, so lookups never touch the disk.
+    """
+
+    def __init__(self, path=ARCHIVE_FILE, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._items = set()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 4:
+                        self._items.add(tuple(parts[:3]))
+                        self._items.add(tuple(parts))
+        except OSError as e:
+            print_warning(f"Ignoring unreadable download archive {self.path}: {e}")
+
+    def _append(self, lines):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.writelines(lines)
+        except OSError as e:
+            print_error(f"Failed to update download archive {self.path}: {e}")
+
+    def contains(self, extractor, video_id, content_type, format_id=None):
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            key = (extractor.lower(), video_id, content_type.lower())
+            if format_id is None:
+                return key in self._items
+            return key + (format_id,) in self._items or key + (ANY_FORMAT,) in self._items
+
+    def add(self, extractor, video_id, content_type, format_id):
+        if not self.enabled:
+            return
+
+        item = (extractor.lower(), video_id, content_type.lower(), format_id)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if item in self._items:
+                return
+            self._items.add(item[:3])
+            self._items.add(item)
+            self._append([" ".join(item) + "\n"])
+
+    def import_yt_dlp_archive(self, path, content_type, format_id=ANY_FORMAT):
+        """Imports a yt-dlp --download-archive file ("<extractor> <id>" lines)."""
+        with open(path, 'r') as f:
+            entries = [line.split() for line in f]
+
+        added = []
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            for parts in entries:
+                if len(parts) != 2:
+                    continue
+                item = (parts[0].lower(), parts[1], content_type.lower(), format_id)
+                if item not in self._items:
+                    self._items.add(item[:3])
+                    self._items.add(item)
+                    added.append(" ".join(item) + "\n")
+            if added:
+                self._append(added)
+        return len(added)
+
+_archive = DownloadArchive()
+
+def configure_archive(settings):
+    global _archive
+    settings = settings or {}
+    _archive = DownloadArchive(
+        path=os.path.expanduser(settings.get("path", ARCHIVE_FILE)),
+        enabled=settings.get("enabled", True),
+    )
+    return _archive
+
+def get_archive():
+    return _archive
+
+def is_archived(url, content_type):
+    key = archive_key_for_url(url)
+    return key is not None and _archive.contains(*key, content_type)
+
+def record_download(url, content_type, format_id):
+    key = archive_key_for_url(url)
+    if key is not None:
+        _archive.add(*key, content_type, format_id)
@@ -0,0 +1,239 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from log import print_error, print_green, print_red, print_warning
+from download import format_filesize, get_best_formats, get_info, select_format, start_download
+from engine import EngineError
+from formats import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, is_valid_quality
+from loading import get_dashboard
+from metrics import DownloadTimer
+from archive import is_archived
+from cache import get_cache
+from playlist import iter_playlist_entries
+from urls import canonical_url, is_collection_url, is_valid_youtube_url
+
+def iter_urls(stream):
+    # Read lazily so huge lists or a producer on stdin start immediately
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def expand_urls(urls, stats):
+    # Playlists and channels are enumerated flat, so their entries are
+    # queued while later pages are still being listed
+    for url in urls:
+        if not is_valid_youtube_url(url):
+            print_warning(f"Skipping '{url}': not a valid youtube url")
+            stats.failure(url, "invalid url")
+            continue
+
+        if not is_collection_url(url):
+            yield canonical_url(url)
+            continue
+
+        try:
+            for entry in iter_playlist_entries(url):
+                yield entry['url']
+        except EngineError as e:
+            print_error(f"Failed to list {url}: {e}")
+            stats.failure(url, "failed to list entries")
+
+class BatchStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.succeeded = 0
+        self.skipped = 0
+        self.total_bytes = 0
+        self.failures = []
+
+    def success(self, size):
+        with self.lock:
+            self.succeeded += 1
+            self.total_bytes += size or 0
+
+    def skip(self):
+        with self.lock:
+            self.skipped += 1
+
+    def failure(self, url, reason):
+        with self.lock:
+            self.failures.append((url, reason))
+
+    def print_summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        total = self.succeeded + self.skipped + len(self.failures)
+
+        print("—" * 60)
+        print_green(f"Batch finished: {total} URLs in {elapsed:.1f}s")
+        print(f"Downloaded : {self.succeeded}")
+        print(f"Skipped    : {self.skipped} (already downloaded)")
+        print(f"Failed     : {len(self.failures)}")
+        print(f"Data       : {format_filesize(self.total_bytes)}"
+              f" ({self.total_bytes / elapsed / (1024 * 1024):.2f} MB/s)")
+        print(f"Rate       : {total / elapsed * 60:.1f} URLs/min")
+        cache = get_cache()
+        if cache.enabled:
+            cache_stats = cache.stats()
+            print(f"Cache      : {cache_stats['hits']} hits, {cache_stats['misses']} misses"
+                  f" ({cache_stats['entries']} entries)")
+        for url, reason in self.failures:
+            print_red(f"  {url}: {reason}")
+        print("—" * 60)
+
+def run_batch(
+        source,
+        config,
+        is_audio=False,
+        quality="best",
+        fetch_workers=4,
+        download_workers=2
+    ):
+    content_type = "Audio" if is_audio else "Video"
+    extensions = AUDIO_EXTENSIONS if is_audio else VIDEO_EXTENSIONS
+    section = config['audio'] if is_audio else config['video']
+    target_codec = section.get("target_codec", "") if is_audio else ""
+    stats = BatchStats()
+    # Downloads waiting for post-processing; their network slot is already free
+    postprocessing = set()
+    postprocessing_done = threading.Condition()
+
+    # The slots bound how far the reader runs ahead of each pool, so memory
+    # stays flat no matter how long the URL list is
+    fetch_slots = threading.BoundedSemaphore(fetch_workers * 2)
+    download_slots = threading.BoundedSemaphore(download_workers * 2)
+
+    def finished(url, timer, task, future):
+        try:
+            if future.result():
+                # What was transferred, not the format's announced size
+                stats.success(timer.bytes)
+                task.finish("done")
+            else:
+                stats.failure(url, "download failed")
+                task.finish("failed")
+        except Exception as e:
+            stats.failure(url, e)
+            task.finish("failed")
+        finally:
+            with postprocessing_done:
+                postprocessing.discard(future)
+                postprocessing_done.notify_all()
+
+    def download_job(url, selected, task):
+        try:
+            timer = DownloadTimer(task)
+            future = start_download(url, selected, content_type, section, quiet=True, progress=timer)
+            with postprocessing_done:
+                postprocessing.add(future)
+            future.add_done_callback(lambda future: finished(url, timer, task, future))
+        except Exception as e:
+            stats.failure(url, e)
+            task.finish("failed")
+        finally:
+            download_slots.release()
+
+    def fetch_job(url):
+        task = dashboard.add(url, "fetching")
+        try:
+            info = get_info(url)
+            if not info:
+                stats.failure(url, "failed to get information")
+                task.finish("failed")
+                return
+
+            formats = get_best_formats(info.get('formats', []), extensions, is_audio=is_audio)
+            selected = select_format(formats, quality, is_audio, target_codec)
+            if selected is None:
+                stats.failure(url, f"no suitable {content_type.lower()} formats")
+                task.finish("failed")
+                return
+
+            task.set_label(info.get('title') or url)
+            task.set_stage("queued")
+            download_slots.acquire()
+            download_pool.submit(download_job, url, selected, task)
+        except Exception as e:
+            stats.failure(url, e)
+            task.finish("failed")
+        finally:
+            fetch_slots.release()
+
+    # One dashboard line per URL from lookup until its file is finished
+    dashboard = get_dashboard()
+    dashboard.start()
+    download_pool = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="download")
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+    try:
+        for url in expand_urls(iter_urls(source), stats):
+            # Checked here rather than in a worker: it is a set lookup
+            if is_archived(url, content_type):
+                stats.skip()
+                continue
+            fetch_slots.acquire()
+            fetch_pool.submit(fetch_job, url)
+        fetch_pool.shutdown()
+        download_pool.shutdown()
+
+        with postprocessing_done:
+            while postprocessing:
+                postprocessing_done.wait()
+    except KeyboardInterrupt:
+        # Running downloads cannot be interrupted, so they are not waited
+        # for; the caller exits without joining them
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        download_pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        dashboard.stop()
+    stats.print_summary()
+    return not stats.failures
+
+def command_quality(args, config):
+    quality = args.quality or config['audio' if args.audio else 'video'].get("quality", "best")
+    if not is_valid_quality(quality):
+        print_error(f"Invalid quality '{quality}': use best, worst, a number or a quality policy")
+        return None
+    return quality
+
+def get_main(args, config):
+    # One-shot downloads of the URLs on the command line, for scripts that
+    # run the tool per URL
+    quality = command_quality(args, config)
+    if quality is None:
+        return False
+    return run_batch(args.urls, config, args.audio, quality)
+
+def batch_main(args, config):
+    quality = command_quality(args, config)
+    if quality is None:
+        return False
+
+    if args.source == "-":
+        return run_batch(
+            sys.stdin, config, args.audio, quality,
+            args.fetch_workers, args.download_workers
+        )
+
+    try:
+        with open(args.source, 'r') as source:
+            return run_batch(
+                source, config, args.audio, quality,
+                args.fetch_workers, args.download_workers
+            )
+    except OSError as e:
+        print_error(f"Cannot read {args.source}: {e}")
+        return False
+
+def download_collection(url, config, is_audio=False):
+    # Asking once keeps a long playlist from prompting for every entry
+    default = config['audio' if is_audio else 'video'].get("quality", "best")
+    while True:
+        quality = input(f"Quality for all entries (best, worst, max height/bitrate or policy) [{default}]: ").strip() or default
+        if is_valid_quality(quality):
+            break
+        print_error(f"Invalid quality '{quality}': use best, worst, a number or a quality policy")
+
+    return run_batch([url], config, is_audio, quality)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Measure download throughput for different fragment/connection settings.
+
+The local media server throttles every connection, so single-stream
+downloads are capped and concurrent fragments scale with the number of
+connections, as on a real CDN.
+
+    python benchmarks/bench_download.py --size 16 --rate 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine import EngineError, create_engine
+from media_server import MediaServer
+
+# (label, url attribute, download options)
+SCENARIOS = [
+    ("direct", "media_url", {}),
+    ("direct, 1M chunks", "media_url", {'http_chunk_size': "1M"}),
+    ("hls, 1 fragment", "hls_url", {'concurrent_fragments': 1}),
+    ("hls, 4 fragments", "hls_url", {'concurrent_fragments': 4}),
+    ("hls, 8 fragments", "hls_url", {'concurrent_fragments': 8}),
+]
+
+def run_scenario(engine, url, extra_options, output_dir):
+    options = {
+        'format': 'best',
+        'outtmpl': os.path.join(output_dir, "%(id)s.%(ext)s"),
+        'quiet': True,
+    }
+    options.update(extra_options)
+
+    start = time.perf_counter()
+    engine.download(url, options)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=16, help="fixture size in MB (default: 16)")
+    parser.add_argument("--rate", type=float, default=4,
+                        help="per-connection limit in MB/s, 0 for unlimited (default: 4)")
+    parser.add_argument("--segments", type=int, default=32, help="HLS segments (default: 32)")
+    parser.add_argument("--backend", default="auto", choices=["auto", "yt_dlp", "subprocess"])
+    parser.add_argument("--aria2c", action="store_true",
+                        help="also measure aria2c with 8 connections (must be installed)")
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS)
+    if args.aria2c:
+        scenarios.append(("direct, aria2c x8", "media_url", {
+            'external_downloader': "aria2c",
+            'external_downloader_args': "-x 8 -s 8 -k 1M",
+        }))
+
+    engine = create_engine(args.backend)
+    rate = args.rate * 1024 * 1024 if args.rate else None
+    size = args.size * 1024 * 1024
+    print(f"engine={engine.name} fixture={args.size}MB "
+          f"per-connection={args.rate or 'unlimited'}MB/s")
+
+    with MediaServer(size=size, segments=args.segments, rate=rate) as server:
+        for label, url_attr, extra_options in scenarios:
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    elapsed = run_scenario(engine, getattr(server, url_attr), extra_options, tmp)
+                except EngineError as e:
+                    print(f"{label:<22} failed: {e}")
+                    continue
+            print(f"{label:<22} {elapsed:7.2f}s {size / elapsed / (1024 * 1024):8.2f} MB/s")
+
+if __name__ == "__main__":
+    main()
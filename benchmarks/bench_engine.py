@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare per-video overhead of the in-process and subprocess engines.
+
+A local HTTP server serves a small media file so the numbers reflect engine
+overhead (interpreter startup, imports, session setup) rather than network
+speed. Pass a real URL with --url to measure against a live site instead.
+
+    python benchmarks/bench_engine.py -n 10
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import SubprocessEngine, YoutubeDLEngine
+
+FIXTURE_SIZE = 256 * 1024
+
+def serve_fixture(directory):
+    with open(os.path.join(directory, "fixture.mp4"), "wb") as f:
+        f.write(os.urandom(FIXTURE_SIZE))
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def log_message(self, format, *args):
+            pass
+
+        def copyfile(self, source, outputfile):
+            try:
+                super().copyfile(source, outputfile)
+            except (BrokenPipeError, ConnectionResetError):
+                # yt-dlp closes probing requests early; that's fine
+                self.close_connection = True
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/fixture.mp4"
+
+def measure(engine, url, runs, output_dir):
+    timings = []
+    for i in range(runs):
+        options = {
+            'format': 'best',
+            'outtmpl': os.path.join(output_dir, f"{engine.name}-{i}.%(ext)s"),
+            'quiet': True,
+        }
+        start = time.perf_counter()
+        engine.extract_info(url)
+        engine.download(url, options)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def report(name, timings):
+    print(f"{name:<12} runs={len(timings):<4} "
+          f"first={timings[0] * 1000:8.1f}ms "
+          f"median={statistics.median(timings) * 1000:8.1f}ms "
+          f"mean={statistics.mean(timings) * 1000:8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--url", help="measure against this URL instead of the local fixture")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        url = args.url
+        if url is None:
+            server, url = serve_fixture(tmp)
+
+        try:
+            engines = [SubprocessEngine()]
+            try:
+                engines.append(YoutubeDLEngine())
+            except ImportError:
+                print("yt_dlp module not installed, skipping the in-process engine")
+
+            for engine in engines:
+                report(engine.name, measure(engine, url, args.runs, tmp))
+        finally:
+            if server:
+                server.shutdown()
+
+if __name__ == "__main__":
+    main()
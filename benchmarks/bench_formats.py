@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Micro-benchmark format ranking on a fixture with hundreds of formats.
+
+Compares the previous two-pass, dict-copying get_best_formats (kept below
+as the baseline) with formats.rank_formats, which ranks video and audio in
+a single pass, and times QualityPolicy selection on top.
+
+    python benchmarks/bench_formats.py -n 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formats import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, QualityPolicy, rank_formats
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "formats_large.json")
+
+def legacy_get_best_formats(formats, extensions, is_audio=False):
+    available_formats = []
+    format_groups = {}
+
+    for fmt in formats:
+        ext = fmt.get('ext', '')
+        has_content = (fmt.get('acodec') != 'none' if is_audio
+                      else fmt.get('vcodec') != 'none')
+
+        if not ext or ext not in extensions or not has_content:
+            continue
+
+        abr = fmt.get('abr') or 0
+        height = fmt.get('height') or 0
+
+        if is_audio:
+            key = f"{int(abr)}kbps_{ext}_{fmt.get('acodec', '')[:10]}"
+        else:
+            key = f"{height}p_{ext}_{fmt.get('vcodec', '')[:10]}"
+
+        if key not in format_groups:
+            format_groups[key] = []
+
+        format_info = {
+            'format_id': fmt.get('format_id', ''),
+            'ext': ext,
+            'filesize': fmt.get('filesize') or fmt.get('filesize_approx', 0),
+            'protocol': fmt.get('protocol', '')
+        }
+
+        if is_audio:
+            format_info.update({
+                'abr': abr,
+                'asr': fmt.get('asr', 0),
+                'acodec': fmt.get('acodec', '')
+            })
+        else:
+            format_info.update({
+                'resolution': fmt.get('resolution', 'unknown'),
+                'height': height,
+                'vcodec': fmt.get('vcodec', '')
+            })
+
+        format_groups[key].append(format_info)
+
+    for formats_list in format_groups.values():
+        formats_list.sort(key=lambda x: (
+            0 if 'https' in x['protocol'] or 'http' in x['protocol'] else 1
+        ))
+        available_formats.append(formats_list[0])
+
+    sort_key = 'abr' if is_audio else 'height'
+    available_formats.sort(key=lambda x: x[sort_key], reverse=True)
+    return available_formats
+
+def legacy_both(formats):
+    return (legacy_get_best_formats(formats, VIDEO_EXTENSIONS),
+            legacy_get_best_formats(formats, AUDIO_EXTENSIONS, is_audio=True))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=2000)
+    parser.add_argument("--fixture", default=FIXTURE)
+    args = parser.parse_args()
+
+    with open(args.fixture) as f:
+        formats = json.load(f)["formats"]
+
+    video, audio = rank_formats(formats)
+    legacy_video, legacy_audio = legacy_both(formats)
+    assert [f['format_id'] for f in video] == [f['format_id'] for f in legacy_video]
+    # Audio now leaves out streams that also carry video
+    assert {f['format_id'] for f in audio} <= {f['format_id'] for f in legacy_audio}
+
+    policy = QualityPolicy.parse("max_height=1080,codecs=av01>vp9>avc1,https,max_size=500M")
+    cases = [
+        ("legacy get_best_formats x2", lambda: legacy_both(formats)),
+        ("rank_formats (one pass)", lambda: rank_formats(formats)),
+        ("rank_formats + policy", lambda: policy.select(rank_formats(formats)[0])),
+    ]
+
+    print(f"{len(formats)} formats -> {len(video)} video / {len(audio)} audio candidates")
+    for label, func in cases:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"{label:<28} {seconds / args.number * 1e6:9.1f} us/call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""End-to-end scenario benchmarks against a stub yt-dlp and a local media server.
+
+Nothing touches the network: the subprocess engine runs stub/yt-dlp, which
+replays the recorded --dump-json fixture (fixtures/video_info.json) and
+downloads from media_server.py at a controlled rate. --backend fake uses
+the in-memory FakeEngine instead, which isolates the tool's own overhead.
+
+Scenarios:
+    single    get_info, format ranking, info box and format table, and
+              download_content for one video, repeated --repeat times
+    batch     run_batch over --urls different videos
+    playlist  run_batch over one playlist of --playlist-size entries
+
+Each scenario runs in its own process, so peak RSS is per scenario (the
+stub yt-dlp processes are not included). Latency percentiles come from the
+metrics event log.
+
+    python benchmarks/bench_scenarios.py
+    python benchmarks/bench_scenarios.py --scenario batch --urls 500 --rate 8
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+STUB_DIR = os.path.join(BENCH_DIR, "stub")
+SCENARIOS = ("single", "batch", "playlist")
+
+def percentile(values, fraction):
+    # Nearest rank
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.5),
+        'p90': percentile(values, 0.9),
+        'p99': percentile(values, 0.99),
+        'max': max(values) if values else None,
+    }
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def read_events(path):
+    events = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                event = json.loads(line)
+                events.setdefault(event['event'], []).append(event)
+    return events
+
+def setup(args, workdir):
+    """Configures the modules like main() does, for the chosen backend."""
+    from config import DEFAULT_CONFIG
+    import engine
+    from archive import configure_archive
+    from cache import configure_cache
+    from metrics import configure_metrics
+    from media_server import MediaServer
+
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    for section in ('video', 'audio'):
+        config[section].update(
+            download_path=os.path.join(workdir, "downloads"),
+            embed_thumbnail=False,
+            embed_metadata=False,
+        )
+    os.makedirs(config['video']['download_path'], exist_ok=True)
+
+    configure_archive({'enabled': False})
+    configure_cache({'enabled': False})
+    configure_metrics({'enabled': True, 'log_path': os.path.join(workdir, "events.jsonl")})
+
+    server = MediaServer(size=args.media_size * 1024, rate=args.rate * 1024 * 1024 or None).start()
+    if args.backend == "stub":
+        os.environ["PATH"] = STUB_DIR + os.pathsep + os.environ["PATH"]
+        os.environ["YTD_STUB_MEDIA_URL"] = server.media_url
+        os.environ["YTD_STUB_PLAYLIST_SIZE"] = str(args.playlist_size)
+        os.environ["YTD_STUB_LATENCY"] = str(args.latency)
+        engine.configure_engine({'backend': "subprocess"})
+    else:
+        from fake_engine import FakeEngine
+        with open(os.path.join(BENCH_DIR, "fixtures", "video_info.json")) as f:
+            info = json.load(f)
+        fake = FakeEngine(info_latency=args.latency)
+        fake.infos = _AnyUrl(info)
+        fake.playlists = _AnyUrl([f"pl{index:09d}" for index in range(args.playlist_size)])
+        engine._engine = fake
+    return config, server
+
+class _AnyUrl(dict):
+    # FakeEngine lookups by URL: every URL gets the same fixture
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+    def __contains__(self, key):
+        return True
+
+    def __getitem__(self, key):
+        return self.value
+
+    def get(self, key, default=None):
+        return self.value
+
+def run_single(args, config):
+    from download import (
+        VIDEO_EXTENSIONS, display_formats, display_info_box, download_content,
+        get_best_formats, get_info, get_video_info_data, select_format,
+    )
+    phases = {'get_info': [], 'get_best_formats': [], 'display': [], 'download_content': []}
+    for index in range(args.repeat):
+        url = f"https://www.youtube.com/watch?v=single{index:06d}"
+
+        started = time.perf_counter()
+        info = get_info(url)
+        phases['get_info'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        formats = get_best_formats(info['formats'], VIDEO_EXTENSIONS)
+        phases['get_best_formats'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            display_info_box(get_video_info_data(info))
+            display_formats(formats)
+        phases['display'].append(time.perf_counter() - started)
+
+        selected = select_format(formats, "best")
+        started = time.perf_counter()
+        download_content(url, selected, "Video", config['video'], quiet=True)
+        phases['download_content'].append(time.perf_counter() - started)
+    return args.repeat, {name: summarize(values) for name, values in phases.items()}
+
+def run_batch_scenario(args, config, urls):
+    from batch import run_batch
+    run_batch(urls, config, fetch_workers=args.fetch_workers, download_workers=args.download_workers)
+    return None, {}
+
+def run_child(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        config, server = setup(args, workdir)
+        started = time.perf_counter()
+        if args.run == "single":
+            operations, phases = run_single(args, config)
+        elif args.run == "batch":
+            urls = [f"https://www.youtube.com/watch?v=batch{index:06d}" for index in range(args.urls)]
+            operations, phases = run_batch_scenario(args, config, urls)
+        else:
+            operations, phases = run_batch_scenario(
+                args, config, ["https://www.youtube.com/playlist?list=PLbenchmark"]
+            )
+        seconds = time.perf_counter() - started
+        server.stop()
+
+        events = read_events(os.path.join(workdir, "events.jsonl"))
+        downloads = events.get('download', [])
+        if operations is None:
+            operations = sum(1 for event in downloads if event['ok'])
+        phases.setdefault('fetch', summarize([e['seconds'] for e in events.get('fetch', [])]))
+        phases.setdefault('download', summarize([e['seconds'] for e in downloads]))
+        phases.setdefault('ttfb', summarize([e['ttfb'] for e in downloads if e['ttfb'] is not None]))
+
+        result = {
+            'scenario': args.run,
+            'backend': args.backend,
+            'operations': operations,
+            'failures': sum(1 for event in downloads if not event['ok']),
+            'seconds': seconds,
+            'throughput': operations / seconds if seconds else None,
+            'bytes': sum(event['bytes'] for event in downloads),
+            'peak_rss_mb': peak_rss_mb(),
+            'phases': phases,
+        }
+    with open(args.result, 'w') as f:
+        json.dump(result, f)
+
+def print_result(result):
+    print(f"\n== {result['scenario']} ({result['backend']}): {result['operations']} downloads "
+          f"in {result['seconds']:.2f}s, {result['throughput']:.1f}/s, "
+          f"{result['bytes'] / result['seconds'] / (1024 * 1024):.1f} MB/s, "
+          f"{result['failures']} failed")
+    print(f"   peak RSS {result['peak_rss_mb']:.1f} MB")
+    print(f"   {'latency':<18} {'n':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in result['phases'].items():
+        if not stats['count']:
+            continue
+        values = " ".join(f"{stats[key] * 1000:9.1f}" for key in ('p50', 'p90', 'p99', 'max'))
+        print(f"   {name:<18} {stats['count']:>6} {values}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--backend", choices=("stub", "fake"), default="stub")
+    parser.add_argument("--repeat", type=int, default=20, help="single: videos (default: 20)")
+    parser.add_argument("--urls", type=int, default=500, help="batch: URLs (default: 500)")
+    parser.add_argument("--playlist-size", type=int, default=1000,
+                        help="playlist: entries (default: 1000)")
+    parser.add_argument("--media-size", type=int, default=256, help="media file in KB (default: 256)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="per-connection limit in MB/s, 0 for unlimited (default: 0)")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="seconds each metadata request takes (default: 0)")
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--download-workers", type=int, default=2)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    # Internal: run one scenario in this process and write its result
+    parser.add_argument("--run", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # Keep the scenario's own output (progress, summaries) out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            run_child(args)
+        return
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    passthrough = [arg for arg in sys.argv[1:] if not arg.startswith("--scenario") and arg not in SCENARIOS + ("all",)]
+    for scenario in scenarios:
+        with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *passthrough,
+                 "--run", scenario, "--result", result_file.name],
+                check=True
+            )
+            result = json.load(open(result_file.name))
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_result(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Benchmark startup: import time and time to the first prompt.
+
+Everything runs in fresh interpreters with HOME pointing at a temporary
+directory holding a config whose download paths are inside it, so the real
+configuration, queue and caches are never touched. Measured:
+
+    import main          -X importtime total for `import main`
+    --help               until argparse has printed the usage
+    --version (cold)     with the yt-dlp version probe not cached yet
+    --version            with the probe cached
+    queue list           a typical scripted call
+    first prompt         from starting `main.py` to "Select download method:"
+
+It also fails if `import main` loads any of HEAVY_MODULES, the imports that
+are deferred until a code path needs them, and with --max-import-ms /
+--max-prompt-ms if the best time is over the limit:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 20 --max-prompt-ms 300
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+PROMPT = b"Select download method:"
+HEAVY_MODULES = ("yt_dlp", "download", "batch", "merge", "wcwidth", "http.server", "importlib.metadata")
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| main$", re.MULTILINE)
+
+def make_home(workdir):
+    config_dir = os.path.join(workdir, ".config", "YtDownloader")
+    os.makedirs(config_dir)
+    section = {'download_path': os.path.join(workdir, "downloads")}
+    with open(os.path.join(config_dir, "config.json"), 'w') as f:
+        json.dump({'video': section, 'audio': section}, f)
+    return dict(os.environ, HOME=workdir, PYTHONPATH=ROOT)
+
+def import_seconds(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return int(IMPORT_TIME_PATTERN.search(result.stderr).group(1)) / 1e6
+
+def loaded_heavy_modules(env):
+    result = subprocess.run(
+        [sys.executable, "-c", "import json, sys, main; print(json.dumps(sorted(sys.modules)))"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    modules = set(json.loads(result.stdout))
+    return [name for name in HEAVY_MODULES if name in modules]
+
+def command_seconds(env, *args, before=None):
+    if before:
+        before()
+    started = time.perf_counter()
+    subprocess.run([sys.executable, MAIN, *args], cwd=ROOT, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+def prompt_seconds(env):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, MAIN], cwd=ROOT, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = os.read(process.stdout.fileno(), 65536)
+            if not chunk:
+                raise RuntimeError(f"main.py exited before prompting:\n{output.decode(errors='replace')}")
+            output += chunk
+        seconds = time.perf_counter() - started
+        process.stdin.write(b"3\n")
+        process.stdin.close()
+        process.wait(timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+    return seconds
+
+def report(label, values):
+    print(f"{label:<20} best {min(values) * 1000:7.1f} ms   median {statistics.median(values) * 1000:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, help="fail if the best `import main` is slower")
+    parser.add_argument("--max-prompt-ms", type=float, help="fail if the best first prompt is slower")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = make_home(workdir)
+        probe_file = os.path.join(workdir, ".config", "YtDownloader", "probe.json")
+
+        def forget_probe():
+            if os.path.exists(probe_file):
+                os.remove(probe_file)
+
+        # Warm up the page cache and the .pyc files
+        command_seconds(env, "--help")
+
+        results = {
+            'import main': [import_seconds(env) for _ in range(args.repeat)],
+            '--help': [command_seconds(env, "--help") for _ in range(args.repeat)],
+            '--version (cold)': [command_seconds(env, "--version", before=forget_probe)
+                                 for _ in range(args.repeat)],
+            '--version': [command_seconds(env, "--version") for _ in range(args.repeat)],
+            'queue list': [command_seconds(env, "queue", "list") for _ in range(args.repeat)],
+            'first prompt': [prompt_seconds(env) for _ in range(args.repeat)],
+        }
+        for label, values in results.items():
+            report(label, values)
+
+        failures = []
+        heavy = loaded_heavy_modules(env)
+        if heavy:
+            failures.append(f"`import main` loads {', '.join(heavy)}")
+        if args.max_import_ms and min(results['import main']) * 1000 > args.max_import_ms:
+            failures.append(f"import main took over {args.max_import_ms:g} ms")
+        if args.max_prompt_ms and min(results['first prompt']) * 1000 > args.max_prompt_ms:
+            failures.append(f"the first prompt took over {args.max_prompt_ms:g} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
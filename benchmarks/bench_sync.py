@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark incremental subscription sync against the stub yt-dlp.
+
+Subscribes to --channels channels of --videos uploads each with
+`subscribe add --new-only`, then runs `sync --no-download` twice:
+
+    first sync   lists every channel in full and records its videos, which
+                 is what every run cost when channels were re-enumerated
+    next sync    after --new uploads per channel; listings stop at the
+                 first known videos, so only their first page is fetched
+
+Each page of 30 entries takes --page-latency seconds, like YouTube's
+listing pages. Checks that exactly the new uploads were queued.
+
+    python benchmarks/bench_sync.py --channels 200 --videos 300 --new 2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+STUB_DIR = os.path.join(BENCH_DIR, "stub")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--videos", type=int, default=300, help="uploads per channel (default: 300)")
+    parser.add_argument("--new", type=int, default=2, help="new uploads per channel before the next sync (default: 2)")
+    parser.add_argument("--page-latency", type=float, default=0.2,
+                        help="seconds per listing page (default: 0.2)")
+    parser.add_argument("--workers", type=int, default=8, help="channels listed at a time (default: 8)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        config_dir = os.path.join(home, ".config", "YtDownloader")
+        os.makedirs(config_dir)
+        downloads = os.path.join(home, "downloads")
+        with open(os.path.join(config_dir, "config.json"), 'w') as f:
+            json.dump({
+                'video': {'download_path': downloads, 'embed_thumbnail': False, 'embed_metadata': False},
+                'audio': {'download_path': downloads, 'embed_thumbnail': False, 'embed_metadata': False},
+                'engine': {'backend': "subprocess"},
+                'storage': {'min_free_space': "0"},
+            }, f)
+        # The stub runs on this interpreter, not whatever python3 is first on PATH
+        path = os.pathsep.join([STUB_DIR, os.path.dirname(sys.executable), os.environ["PATH"]])
+        env = dict(os.environ, HOME=home, PATH=path,
+                   YTD_STUB_PAGE_LATENCY=str(args.page_latency))
+        main_py = os.path.join(ROOT_DIR, "main.py")
+
+        def run(*command, videos):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, main_py, *command],
+                           env=dict(env, YTD_STUB_PLAYLIST_SIZE=str(videos)),
+                           check=True, stdout=subprocess.DEVNULL)
+            return time.perf_counter() - started
+
+        channels = [f"https://www.youtube.com/channel/UCbench{index:05d}" for index in range(args.channels)]
+        run("subscribe", "add", "--new-only", *channels, videos=args.videos)
+        first = run("sync", "--no-download", "--workers", str(args.workers), videos=args.videos)
+        after = run("sync", "--no-download", "--workers", str(args.workers), videos=args.videos + args.new)
+
+        with open(os.path.join(config_dir, "jobs.json")) as f:
+            queued = len(json.load(f)['jobs'])
+        with open(os.path.join(config_dir, "subscriptions.json")) as f:
+            known = sum(len(entry['known']) for entry in json.load(f)['subscriptions'])
+
+    print(f"{args.channels} channels of {args.videos} videos, {args.page_latency}s per page, "
+          f"{args.workers} listed at a time")
+    print(f"first sync (full listing):  {first:7.2f}s")
+    print(f"next sync (+{args.new} per channel): {after:7.2f}s  {first / after:5.1f}x faster")
+    print(f"queued: {queued} (expected {args.channels * args.new}), known IDs stored: {known}")
+    if queued != args.channels * args.new:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Benchmark URL validation and canonicalization on 100k URLs.
+
+The URLs are random spellings (watch?v= with extra parameters, youtu.be,
+shorts, embed, mobile, playlists, channels and some invalid ones) of a
+smaller set of videos. Compares the previous validator, which compiled its
+pattern on every call, and the previous video ID search (both kept below as
+the baseline) with urls.py, then checks that concurrent lookups of one
+video in different spellings share a single fetch.
+
+    python benchmarks/bench_urls.py -n 100000
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from cache import configure_cache
+from download import get_info
+from fake_engine import FakeEngine
+from urls import canonical_url, canonicalize, extract_video_id, is_valid_youtube_url
+
+ID_CHARS = string.ascii_letters + string.digits + "_-"
+
+LEGACY_VIDEO_ID_PATTERN = re.compile(
+    r"(?:youtu\.be/|youtube\.com/(?:watch\?(?:.*&)?v=|embed/|v/|shorts/))"
+    r"([A-Za-z0-9_-]{11})"
+)
+
+def legacy_extract_video_id(url):
+    if not url:
+        return None
+    match = LEGACY_VIDEO_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+def legacy_is_valid_youtube_url(url):
+    if not url:
+        return False
+    pattern = re.compile(
+        r"^(https?://)?(www\.)?"
+        r"(youtube\.com/(watch\?v=|embed/|v/|shorts/"
+        r"|playlist\?list=|user/|c/|channel/)|youtu\.be/)"
+        r"[A-Za-z0-9_-]+"
+        r"([?&][A-Za-z0-9_=-]+)*$"
+    )
+    return re.match(pattern, url) is not None
+
+def random_id(rng, length=11):
+    return "".join(rng.choice(ID_CHARS) for _ in range(length))
+
+SPELLINGS = (
+    "https://www.youtube.com/watch?v={id}",
+    "https://www.youtube.com/watch?v={id}&t=42s",
+    "https://youtube.com/watch?feature=share&v={id}",
+    "http://m.youtube.com/watch?v={id}&list=PL{list}",
+    "https://youtu.be/{id}",
+    "https://youtu.be/{id}?si=AbCdEf",
+    "youtu.be/{id}",
+    "https://www.youtube.com/shorts/{id}",
+    "https://www.youtube.com/embed/{id}",
+    "https://music.youtube.com/watch?v={id}",
+)
+OTHER_URLS = (
+    "https://www.youtube.com/playlist?list=PL{list}",
+    "https://www.youtube.com/channel/UC{list}",
+    "https://www.youtube.com/@handle{id}",
+    "https://example.com/watch?v={id}",
+    "not a url {id}",
+)
+
+def make_urls(count, videos, seed=1):
+    rng = random.Random(seed)
+    ids = [random_id(rng) for _ in range(videos)]
+    urls = []
+    for _ in range(count):
+        templates = OTHER_URLS if rng.random() < 0.1 else SPELLINGS
+        urls.append(rng.choice(templates).format(id=rng.choice(ids), list=random_id(rng, 16)))
+    return urls
+
+def timed(label, func, urls, repeat=3):
+    seconds = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for url in urls:
+            func(url)
+        seconds = min(seconds, time.perf_counter() - started)
+    print(f"{label:<32} {seconds / len(urls) * 1e9:8.0f} ns/url {len(urls) / seconds / 1e6:6.2f} M urls/s")
+
+def check_coalescing(spellings=10, callers=100):
+    fake = FakeEngine(info_latency=0.2)
+    engine._engine = fake
+    configure_cache({"enabled": False})
+    video_id = "dQw4w9WgXcQ"
+    urls = [template.format(id=video_id, list="x") for template in SPELLINGS[:spellings]]
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(get_info, (urls[i % len(urls)] for i in range(callers))))
+    fetches = sum(1 for method, _ in fake.calls if method == "extract_info")
+    assert all(result is results[0] for result in results)
+    print(f"{callers} concurrent lookups in {len(urls)} spellings -> {fetches} fetch(es)")
+    assert fetches == 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=100_000)
+    parser.add_argument("--videos", type=int, default=20_000)
+    args = parser.parse_args()
+
+    urls = make_urls(args.number, args.videos)
+    for url in urls:
+        assert legacy_is_valid_youtube_url(url) == is_valid_youtube_url(url), url
+    video_urls = {url for url in urls if extract_video_id(url)}
+    canonical = {canonical_url(url) for url in video_urls}
+    print(f"{len(urls)} urls, {len(set(urls))} distinct spellings, "
+          f"{len(video_urls)} video spellings -> {len(canonical)} videos")
+
+    timed("legacy is_valid_youtube_url", legacy_is_valid_youtube_url, urls)
+    timed("is_valid_youtube_url", is_valid_youtube_url, urls)
+    timed("legacy extract_video_id", legacy_extract_video_id, urls)
+    timed("canonicalize", canonicalize, urls)
+    timed("canonical_url", canonical_url, urls)
+
+    check_coalescing()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Benchmark display widths on a playlist of multilingual titles.
+
+Titles are the recorded ones in fixtures/titles.txt (CJK, Korean, Arabic,
+Devanagari, emoji and plain ASCII), repeated up to --entries. Compares the
+previous per-character wcwidth helpers and row-by-row printing (kept below
+as the baseline) with textwidth.py and the buffered tables, on:
+
+    width       display_width of every title
+    fit         cutting every title to 40 columns
+    info box    display_info_box for every title
+    formats     the format table of fixtures/video_info.json, --tables times
+    dashboard   a dashboard line per title at 100 columns
+
+Output goes to a line-buffered /dev/null, which flushes every line like a
+terminal does.
+
+    python benchmarks/bench_width.py --entries 5000
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import wcwidth
+from download import (
+    MAX_BOX_WIDTH, VIDEO_EXTENSIONS, display_formats, display_info_box,
+    format_filesize, get_video_info_data,
+)
+from formats import format_size, is_merged, pair_formats, rank_formats
+from loading import STATUS_WIDTH, Task, _duration
+from textwidth import display_width, fit
+
+def legacy_display_width(text):
+    return sum(wcwidth.wcwidth(char) for char in str(text))
+
+def legacy_truncate_text(text, max_display_width):
+    text = str(text)
+    current_width = 0
+    result_chars = []
+    for char in text:
+        char_width = wcwidth.wcwidth(char)
+        if current_width + char_width > max_display_width - 3:
+            result_chars.append("...")
+            break
+        result_chars.append(char)
+        current_width += char_width
+    return ''.join(result_chars)
+
+def legacy_display_info_box(info_data, title="INFORMATION"):
+    max_label_width = max(legacy_display_width(label) for label, _ in info_data)
+    box_width = min(MAX_BOX_WIDTH, max(60, max_label_width + 60))
+    print("┌" + "─" * box_width + "┐")
+    print("│" + title.center(box_width) + "│")
+    print("├" + "─" * box_width + "┤")
+    for label, value in info_data:
+        available_width = box_width - max_label_width - 5
+        value_str = legacy_truncate_text(value, available_width)
+        label_padding = max_label_width - legacy_display_width(label)
+        line = f"│ {label}{' ' * label_padding} : {value_str}"
+        right_padding = box_width - (legacy_display_width(line) - 1)
+        print(line + ' ' * right_padding + "│")
+    print("└" + "─" * box_width + "┘")
+
+def legacy_display_formats(formats):
+    print("Available formats:")
+    print("—" * 60)
+    for idx, fmt in enumerate(formats, 1):
+        codecs = f"{fmt['vcodec']} + {fmt['acodec']}" if is_merged(fmt) else fmt['vcodec']
+        print(f"{idx}. {fmt['resolution']} [{fmt['ext'].upper()}] - {format_filesize(fmt['filesize'])} - {codecs}")
+    print("—" * 60)
+
+def legacy_render(task, width):
+    # A downloading line, cut by characters as the dashboard did
+    percent = min(task.downloaded_bytes * 100 / task.total_bytes, 100)
+    status = f"{task.stage:<15}"
+    status += f" {percent:5.1f}% of {format_size(task.total_bytes):>9}"
+    status += f" {format_size(task.speed):>8}/s"
+    status += f" ETA {_duration(task.eta)}"
+    label_width = max(width - STATUS_WIDTH - 1, 10)
+    label = task.label if len(task.label) <= label_width else task.label[:label_width - 1] + "…"
+    return f"{label:<{label_width}} {status:<{STATUS_WIDTH}}"[:width].rstrip()
+
+def load_titles(count):
+    with open(os.path.join(BENCH_DIR, "fixtures", "titles.txt"), encoding="utf-8") as f:
+        recorded = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [f"{recorded[index % len(recorded)]} ({index})" for index in range(count)]
+
+def timed(func, repeat=3):
+    seconds = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - started)
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--tables", type=int, default=200, help="format tables to render (default: 200)")
+    args = parser.parse_args()
+
+    titles = load_titles(args.entries)
+    for title in titles[:500]:
+        assert display_width(title) == sum(max(wcwidth.wcwidth(char), 0) for char in title), title
+        text, width = fit(title, 40)
+        assert width == display_width(text) and width <= 40, title
+
+    info = json.load(open(os.path.join(BENCH_DIR, "fixtures", "video_info.json"), encoding="utf-8"))
+    boxes = [get_video_info_data(dict(info, title=title, channel=title.split(" - ")[0])) for title in titles]
+    video, audio = rank_formats(info['formats'], VIDEO_EXTENSIONS, ("m4a", "webm"))
+    formats = pair_formats(video, audio)
+
+    tasks = [Task(None, title, stage="downloading") for title in titles]
+    for task in tasks:
+        task.downloaded_bytes, task.total_bytes, task.speed, task.eta = 5_400_000, 12_900_000, 1_260_000, 10
+
+    print(f"{len(titles)} titles, {len(formats)} formats per table")
+    print(f"{'':<12} {'before':>12} {'after':>12} {'speedup':>8}")
+    cases = [
+        ("width", lambda: [legacy_display_width(t) for t in titles],
+                  lambda: [display_width(t) for t in titles]),
+        ("fit", lambda: [legacy_truncate_text(t, 40) for t in titles],
+                lambda: [fit(t, 40) for t in titles]),
+        ("info box", lambda: [legacy_display_info_box(box) for box in boxes],
+                     lambda: [display_info_box(box) for box in boxes]),
+        ("formats", lambda: [legacy_display_formats(formats) for _ in range(args.tables)],
+                    lambda: [display_formats(formats) for _ in range(args.tables)]),
+        ("dashboard", lambda: [legacy_render(task, 100) for task in tasks],
+                      lambda: [task.render(100) for task in tasks]),
+    ]
+    for label, legacy, current in cases:
+        with open(os.devnull, 'w', buffering=1, encoding="utf-8") as out, contextlib.redirect_stdout(out):
+            before, after = timed(legacy), timed(current)
+        print(f"{label:<12} {before * 1000:9.1f} ms {after * 1000:9.1f} ms {before / after:7.1f}x")
+
+    overflowing = sum(1 for task in tasks if display_width(legacy_render(task, 100)) > 100)
+    print(f"dashboard lines wider than 100 columns: {overflowing} before, "
+          f"{sum(1 for task in tasks if display_width(task.render(100)) > 100)} after")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Benchmark worker mode: several worker processes sharing one job store.
+
+Queues --jobs videos in a shared job store with `queue add --shared`, then
+starts --workers `main.py worker --drain` processes against it, with the
+stub yt-dlp and a rate-limited media_server.py standing in for YouTube.
+With --kill-after, the first worker is killed with SIGKILL that many
+seconds in, as if its host went away; its jobs must be taken over by the
+others once their --lease runs out.
+
+Checks that every job ends up done and reports how many were taken over,
+the wall time and the throughput.
+
+    python benchmarks/bench_workers.py --workers 3 --jobs 30 --kill-after 2
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from jobs import DONE
+from jobstore import SQLiteJobStore
+from media_server import MediaServer
+
+STUB_DIR = os.path.join(BENCH_DIR, "stub")
+
+def write_config(home, args):
+    store = os.path.join(home, "shared", "jobs.sqlite")
+    downloads = os.path.join(home, "shared", "downloads")
+    config = {
+        'video': {'download_path': downloads, 'embed_thumbnail': False, 'embed_metadata': False},
+        'audio': {'download_path': downloads, 'embed_thumbnail': False, 'embed_metadata': False},
+        'engine': {'backend': "subprocess"},
+        'storage': {'min_free_space': "0"},
+        'worker': {'store': store, 'concurrency': args.concurrency, 'lease': args.lease,
+                   'poll_interval': 0.5},
+    }
+    path = os.path.join(home, ".config", "YtDownloader", "config.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return store, downloads
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3, help="worker processes (default: 3)")
+    parser.add_argument("--concurrency", type=int, default=2, help="downloads per worker (default: 2)")
+    parser.add_argument("--jobs", type=int, default=30, help="videos to queue (default: 30)")
+    parser.add_argument("--media-size", type=int, default=2048, help="KiB per download (default: 2048)")
+    parser.add_argument("--rate", type=float, default=2, help="MiB/s per download (default: 2)")
+    parser.add_argument("--lease", type=float, default=3, help="lease in seconds (default: 3)")
+    parser.add_argument("--kill-after", type=float, default=2,
+                        help="seconds before the first worker is killed, 0 to keep it (default: 2)")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    server = MediaServer(size=args.media_size * 1024, rate=args.rate * 1024 * 1024 or None).start()
+    with tempfile.TemporaryDirectory() as home:
+        store_path, downloads = write_config(home, args)
+        env = dict(os.environ, HOME=home, YTD_STUB_MEDIA_URL=server.media_url,
+                   PATH=STUB_DIR + os.pathsep + os.environ["PATH"])
+        main_py = os.path.join(ROOT_DIR, "main.py")
+
+        urls = [f"https://www.youtube.com/watch?v=wk{index:09d}" for index in range(args.jobs)]
+        subprocess.run([sys.executable, main_py, "queue", "add", "--shared", *urls],
+                       env=env, check=True, stdout=subprocess.DEVNULL)
+
+        started = time.perf_counter()
+        workers = []
+        for index in range(args.workers):
+            log = open(os.path.join(home, f"worker{index}.log"), 'w')
+            workers.append((subprocess.Popen([sys.executable, main_py, "worker", "--drain"],
+                                             env=env, stdout=log, stderr=subprocess.STDOUT), log))
+
+        killed = None
+        deadline = started + args.timeout
+        while any(process.poll() is None for process, _ in workers):
+            elapsed = time.perf_counter() - started
+            if killed is None and args.kill_after and elapsed >= args.kill_after:
+                killed = workers[0][0]
+                killed.send_signal(signal.SIGKILL)
+            if time.perf_counter() > deadline:
+                for process, _ in workers:
+                    process.kill()
+                break
+            time.sleep(0.05)
+        seconds = time.perf_counter() - started
+        for _, log in workers:
+            log.close()
+        server.stop()
+
+        jobs = SQLiteJobStore(store_path).jobs()
+        done = [job for job in jobs if job['state'] == DONE]
+        taken_over = [job for job in jobs if job['attempts'] > 1]
+        files = [name for name in os.listdir(downloads) if not name.endswith((".part", ".ytdl"))]
+
+        print(f"{args.workers} workers x {args.concurrency}, {args.jobs} jobs of "
+              f"{args.media_size} KiB at {args.rate} MiB/s, lease {args.lease}s")
+        if killed is not None:
+            print(f"killed worker pid {killed.pid} after {args.kill_after}s")
+        print(f"done: {len(done)}/{len(jobs)}, taken over: {len(taken_over)}, files: {len(files)}")
+        print(f"wall time: {seconds:.2f}s, {len(done) / seconds:.2f} jobs/s, "
+              f"{len(done) * args.media_size / 1024 / seconds:.1f} MiB/s")
+        failed = [job for job in jobs if job['state'] != DONE]
+        for job in failed:
+            print(f"  #{job['id']} {job['state']} {job['error'] or ''}")
+        if failed or (killed is not None and not taken_over):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
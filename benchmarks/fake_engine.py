@@ -0,0 +1,102 @@
+"""In-memory stand-in for the yt-dlp engines used by benchmarks.
+
+FakeEngine implements the engine interface (extract_info, iter_flat_entries,
+download) without touching the network. Failures can be injected per URL as
+a list of yt-dlp error messages that are raised, in order, before the call
+succeeds.
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import EngineError, download_result
+
+# Representative yt-dlp error messages for each failure class
+TRANSIENT_ERRORS = [
+    "ERROR: [youtube] abc: Unable to download API page: HTTP Error 503: Service Unavailable",
+    "ERROR: unable to download video data: <urlopen error [Errno 104] Connection reset by peer>",
+    "ERROR: [download] Got error: The read operation timed out",
+]
+RATE_LIMITED_ERRORS = [
+    "ERROR: [youtube] abc: Unable to download webpage: HTTP Error 429: Too Many Requests",
+    "ERROR: [youtube] abc: Sign in to confirm you're not a bot",
+]
+PERMANENT_ERRORS = [
+    "ERROR: [youtube] abc: Private video. Sign in if you've been granted access to this video",
+    "ERROR: [youtube] abc: Video unavailable. This video has been removed by the uploader",
+]
+
+def make_info(video_id, title="Fixture video"):
+    return {
+        "id": video_id,
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+        "title": title,
+        "channel": "Fixture channel",
+        "uploader": "Fixture channel",
+        "duration_string": "3:32",
+        "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+        "_version": {"version": "fake"},
+        "formats": [
+            {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2",
+             "height": 360, "resolution": "640x360", "protocol": "https", "filesize": 8_000_000},
+            {"format_id": "137", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none",
+             "height": 1080, "resolution": "1920x1080", "protocol": "https", "filesize": 60_000_000},
+            {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2",
+             "abr": 129.5, "asr": 44100, "protocol": "https", "filesize": 3_400_000},
+            {"format_id": "251", "ext": "webm", "vcodec": "none", "acodec": "opus",
+             "abr": 135.2, "asr": 48000, "protocol": "https", "filesize": 3_600_000},
+        ],
+    }
+
+class FakeEngine:
+    name = "fake"
+
+    def __init__(self, info_latency=0.0, download_latency=0.0, infos=None, playlists=None):
+        self.info_latency = info_latency
+        self.download_latency = download_latency
+        self.infos = infos or {}
+        self.playlists = playlists or {}
+        self.failures = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def inject(self, url, *messages):
+        self.failures.setdefault(url, []).extend(messages)
+
+    def _maybe_fail(self, method, url):
+        with self._lock:
+            self.calls.append((method, url))
+            pending = self.failures.get(url)
+            message = pending.pop(0) if pending else None
+        if message:
+            raise EngineError(message)
+
+    def extract_info(self, url):
+        time.sleep(self.info_latency)
+        self._maybe_fail("extract_info", url)
+        return self._info(url)
+
+    def _info(self, url):
+        if url in self.infos:
+            return self.infos[url]
+        return make_info(url.rsplit("=", 1)[-1].rsplit("/", 1)[-1][-11:])
+
+    def iter_flat_entries(self, url):
+        self._maybe_fail("iter_flat_entries", url)
+        for video_id in self.playlists.get(url, []):
+            yield {"_type": "url", "ie_key": "Youtube", "id": video_id,
+                   "url": f"https://www.youtube.com/watch?v={video_id}"}
+
+    def download(self, url, options, progress=None):
+        time.sleep(self.download_latency)
+        self._maybe_fail("download", url)
+        if progress:
+            progress({"stage": "download", "status": "finished",
+                      "downloaded_bytes": 1, "total_bytes": 1})
+        # Nothing is written, so there is no file to post-process
+        return download_result(self._info(url))
@@ -0,0 +1,139 @@
+"""Local HTTP server that stands in for a media CDN in benchmarks.
+
+Serves a random fixture file as /media.mp4 (with Range support) and the same
+bytes split into an HLS playlist at /hls/index.m3u8. Each connection is
+throttled to `rate` bytes per second, which is how real CDNs cap a single
+stream and what multi-connection downloads work around.
+"""
+
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+WRITE_CHUNK = 64 * 1024
+
+class MediaServer:
+    def __init__(self, size=16 * 1024 * 1024, segments=32, rate=None):
+        self.data = os.urandom(size)
+        self.segments = segments
+        self.rate = rate
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def media_url(self):
+        return f"{self.base_url}/media.mp4"
+
+    @property
+    def hls_url(self):
+        return f"{self.base_url}/hls/index.m3u8"
+
+    def segment_bounds(self, index):
+        segment_size = -(-len(self.data) // self.segments)
+        start = index * segment_size
+        return start, min(start + segment_size, len(self.data))
+
+    def playlist(self):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2",
+                 "#EXT-X-MEDIA-SEQUENCE:0"]
+        for index in range(self.segments):
+            lines.extend(["#EXTINF:2.0,", f"segment{index}.ts"])
+        lines.append("#EXT-X-ENDLIST")
+        return ("\n".join(lines) + "\n").encode()
+
+    def _count(self, size):
+        with self._lock:
+            self.bytes_served += size
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_body(self, body, content_type, status=200, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Accept-Ranges", "bytes")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command == "HEAD":
+                    return
+
+                # Sleeping between chunks caps this connection at server.rate
+                started = time.monotonic()
+                sent = 0
+                view = memoryview(body)
+                while sent < len(body):
+                    chunk = view[sent:sent + WRITE_CHUNK]
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Clients close ranged requests early; that's fine
+                        self.close_connection = True
+                        return
+                    sent += len(chunk)
+                    server._count(len(chunk))
+                    if server.rate:
+                        delay = sent / server.rate - (time.monotonic() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                if self.path == "/media.mp4":
+                    data = server.data
+                    match = RANGE_PATTERN.match(self.headers.get("Range", ""))
+                    if not match:
+                        return self._send_body(data, "video/mp4")
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else len(data) - 1
+                    end = min(end, len(data) - 1)
+                    return self._send_body(
+                        data[start:end + 1], "video/mp4", 206,
+                        {"Content-Range": f"bytes {start}-{end}/{len(data)}"}
+                    )
+
+                if self.path == "/hls/index.m3u8":
+                    return self._send_body(server.playlist(), "application/vnd.apple.mpegurl")
+
+                match = re.fullmatch(r"/hls/segment(\d+)\.ts", self.path)
+                if match and int(match.group(1)) < server.segments:
+                    start, end = server.segment_bounds(int(match.group(1)))
+                    return self._send_body(server.data[start:end], "video/mp2t")
+
+                self.send_error(404)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
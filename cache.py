@@ -0,0 +1,109 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from jsonfile import load_json, save_json
+
+CACHE_FILE = os.path.expanduser("~/.config/YtDownloader/cache.json")
+
+class MetadataCache:
+    def __init__(self, path=CACHE_FILE, ttl=3600, max_entries=64, enabled=True, save_every=16):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Entries put since the last save; the rest are saved at exit
+        self._unsaved = 0
+
+    def _load(self):
+        # Loaded lazily so a cold start doesn't pay for reading the cache file
+        self._loaded = True
+        # Entries are stored oldest-used first, which is the LRU order
+        for key, entry in load_json(self.path, "metadata cache").get("entries", []):
+            self._entries[key] = entry
+
+    def _save(self):
+        self._unsaved = 0
+        save_json(self.path, {"entries": list(self._entries.items())}, "metadata cache")
+
+    def get(self, key):
+        if not self.enabled or key is None:
+            return None
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if time.time() - entry["time"] > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["info"]
+
+    def put(self, key, info):
+        if not self.enabled or key is None or not info:
+            return
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            self._entries[key] = {"time": time.time(), "info": info}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            # Rewriting the whole file on every lookup made batches of new
+            # videos quadratic, so it is written every save_every entries
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+_cache = MetadataCache()
+
+def configure_cache(settings):
+    global _cache
+    settings = settings or {}
+    _cache = MetadataCache(
+        path=os.path.expanduser(settings.get("path", CACHE_FILE)),
+        ttl=settings.get("ttl", 3600),
+        max_entries=settings.get("max_entries", 64),
+        enabled=settings.get("enabled", True),
+        save_every=settings.get("save_every", 16),
+    )
+    return _cache
+
+def get_cache():
+    return _cache
+
+def _save_at_exit():
+    _cache.save()
+
+atexit.register(_save_at_exit)
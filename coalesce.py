@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import Future
+
+class Coalescer:
+    """Lets concurrent callers with the same key share one piece of work.
+
+    run() is for blocking calls: while one caller runs func for a key,
+    others asking for the same key wait for its result instead of calling
+    func again. share() is for calls that return a Future: every caller
+    gets the same Future until it resolves, together with the context the
+    caller that started the work passed, so later callers can hook into
+    it. Once the work is done, the next caller starts afresh. A key of None
+    is never shared.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = {}
+
+    def run(self, key, func):
+        if key is None:
+            return func()
+        with self._lock:
+            future = self._running.get(key)
+            leader = future is None
+            if leader:
+                future = self._running[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._forget(key)
+            future.set_exception(e)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def share(self, key, start, context=None):
+        """Returns (future, context of the caller that started the work)."""
+        if key is None:
+            return start(), context
+        with self._lock:
+            running = self._running.get(key)
+            if running is not None:
+                return running
+            shared = Future()
+            self._running[key] = (shared, context)
+
+        def resolve(future):
+            self._forget(key)
+            if future.exception() is not None:
+                shared.set_exception(future.exception())
+            else:
+                shared.set_result(future.result())
+
+        try:
+            started = start()
+        except BaseException as e:
+            self._forget(key)
+            shared.set_exception(e)
+            raise
+        started.add_done_callback(resolve)
+        return shared, context
+
+    def _forget(self, key):
+        with self._lock:
+            self._running.pop(key, None)
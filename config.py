@@ -1,3 +1,4 @@
+import copy
 import json
 import os
 from log import print_error, print_warning
@@ -9,28 +10,98 @@ DEFAULT_CONFIG = {
         "download_path": "/sdcard/Download/YouTubeDownload/Video/",
         "filename_template": "%(title)s - %(channel)s.%(ext)s",
         "embed_thumbnail": True,
-        "embed_metadata": True
+        "embed_metadata": True,
+        "quality": "best",
+        "concurrent_fragments": 4,
+        "external_downloader": "",
+        "external_downloader_args": "",
+        "http_chunk_size": ""
     },
     "audio": {
         "download_path": "/sdcard/Download/YouTubeDownload/Audio/",
         "filename_template": "%(title)s - %(channel)s.%(ext)s",
         "embed_thumbnail": True,
-        "embed_metadata": True
+        "embed_metadata": True,
+        "quality": "best",
+        "target_codec": "",
+        "concurrent_fragments": 1,
+        "external_downloader": "",
+        "external_downloader_args": "",
+        "http_chunk_size": ""
+    },
+    "interactive": {
+        "prefetch_workers": 3
+    },
+    "queue": {
+        "max_parallel": 2,
+        "rate_limit": "",
+        "path": "~/.config/YtDownloader/jobs.json"
+    },
+    "postprocess": {
+        "workers": 0
+    },
+    "engine": {
+        "backend": "auto"
+    },
+    "retry": {
+        "max_attempts": 4,
+        "base_delay": 2,
+        "max_delay": 60,
+        "rate_limit_delay": 30,
+        "breaker_threshold": 5,
+        "breaker_window": 60,
+        "breaker_cooldown": 120
+    },
+    "cache": {
+        "enabled": True,
+        "ttl": 3600,
+        "max_entries": 64,
+        "save_every": 16
+    },
+    "archive": {
+        "enabled": True,
+        "path": "~/.config/YtDownloader/archive.txt"
+    },
+    "journal": {
+        "enabled": True,
+        "path": "~/.config/YtDownloader/journal.json",
+        "auto_resume": False
+    },
+    "storage": {
+        "min_free_space": "100M",
+        "check_free_space": True
+    },
+    "subscriptions": {
+        "path": "~/.config/YtDownloader/subscriptions.json",
+        "workers": 8,
+        "stop_after": 3,
+        "max_known": 1000
+    },
+    "worker": {
+        "store": "~/.config/YtDownloader/shared-jobs.sqlite",
+        "concurrency": 2,
+        "lease": 120,
+        "max_attempts": 3,
+        "poll_interval": 5
+    },
+    "metrics": {
+        "enabled": False,
+        "log_path": "~/.config/YtDownloader/events.jsonl",
+        "prometheus_port": 0
     }
 }
 
 def load_config():
-    config = DEFAULT_CONFIG.copy()
+    config = copy.deepcopy(DEFAULT_CONFIG)
     
     if os.path.exists(CONFIG_FILE):
         try:
             with open(CONFIG_FILE, 'r') as f:
                 user_config = json.load(f)
                 # Deep merge for nested structure
-                if 'video' in user_config:
-                    config['video'].update(user_config['video'])
-                if 'audio' in user_config:
-                    config['audio'].update(user_config['audio'])
+                for section in config:
+                    if isinstance(user_config.get(section), dict):
+                        config[section].update(user_config[section])
         except json.JSONDecodeError:
             print_error(f"Error reading {CONFIG_FILE}. Using default configuration.")
             save_config(DEFAULT_CONFIG)
@@ -52,19 +123,23 @@ def save_config(config_data):
     except Exception as e:
         print_error(f"Error saving {CONFIG_FILE}: {e}")
 
-# Ensure the download paths from config exist
+# download_path is one directory or a list of them, e.g. on different disks
+def download_paths(section):
+    paths = section.get("download_path") or []
+    return [paths] if isinstance(paths, str) else list(paths)
+
+# Ensure the download paths from config exist; with several, at least one
+# per content type has to
 def ensure_download_path_exists(config):
-    paths_to_check = [
-        config.get("video", {}).get("download_path"),
-        config.get("audio", {}).get("download_path")
-    ]
-    
     all_paths_ok = True
-    for path in paths_to_check:
-        if path:
+    for section in ("video", "audio"):
+        usable = 0
+        for path in download_paths(config.get(section, {})):
             try:
                 os.makedirs(path, exist_ok=True)
+                usable += 1
             except OSError as e:
                 print_error(f"Failed to create download directory {path}: {e}")
-                all_paths_ok = False
+        if not usable:
+            all_paths_ok = False
     return all_paths_ok
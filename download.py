@@ -1,60 +1,106 @@
-import subprocess
-import wcwidth
 from log import print_error, print_red, print_success, print_warning
 import os
-import json
-from loading import start_loading, stop_loading
+import threading
+import time
+from cache import get_cache
+from urls import canonical_url, extract_video_id
+from engine import EngineError, get_engine
+from archive import record_download
+from retry import get_retry_policy
+from metrics import DownloadTimer, get_metrics
+from journal import get_journal
+from formats import (
+    AUDIO_EXTENSIONS,
+    AUDIO_TARGETS,
+    VIDEO_EXTENSIONS,
+    QualityPolicy,
+    can_remux,
+    conversion_for,
+    format_size,
+    is_merged,
+    pair_formats,
+    rank_formats,
+)
+from merge import can_merge, download_merged, merged_path
+from postprocess import ffmpeg_available, finalize_file, get_postprocess_pool, metadata_tags
+from concurrent.futures import Future
+from coalesce import Coalescer
+from textwidth import display_width, fit
+from config import download_paths
+from storage import StorageError, get_storage
 
 # Constants
-VIDEO_EXTENSIONS = ["webm", "mp4", "mkv", "mov"]
-AUDIO_EXTENSIONS = ["m4a", "mp3", "opus", "webm", "aac"]
 MAX_BOX_WIDTH = 80
 THUMBNAIL_EMBED_SUPPORTED_EXTENSIONS = ["mp3", "mkv", "mka", "ogg", "opus", "flac", "m4a", "mp4", "m4v", "mov"]
 
-def run_yt_dlp_command(command):
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return result.stdout, None
-    except subprocess.CalledProcessError as e:
-        return None, print_error(f"yt-dlp: {e}")
-    except Exception as e:
-        return None, print_error(e)
-
-def get_info(url):
-    command = ["yt-dlp", url, "--dump-json"]
-    
-    stdout, error = run_yt_dlp_command(command)
-    if error:
-        print_error(error)
-        return None
+# Lookups and downloads in flight, so the same video asked for twice at
+# once (in any spelling of its URL) is fetched and downloaded only once
+_fetches = Coalescer()
+_downloads = Coalescer()
 
-    if stdout is None:
-        print_error("No output received from yt-dlp")
-        return None
+class _Listeners:
+    """The progress and placed callbacks of every caller of one shared
+    download. Events passed on to callers that joined a running download
+    are marked 'joined', so byte counts do not count the transfer twice."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress = []
+        self._placed = []
+        self._path = None
+
+    def add(self, progress, placed, joined=False):
+        with self._lock:
+            if progress:
+                self._progress.append((progress, joined))
+            if placed and self._path is None:
+                self._placed.append(placed)
+                placed = None
+            path = self._path
+        # Joined after the download path was chosen
+        if placed:
+            placed(path)
+
+    def progress(self, event):
+        with self._lock:
+            callbacks = list(self._progress)
+        for callback, joined in callbacks:
+            callback(dict(event, joined=True) if joined else event)
 
+    def placed(self, path):
+        with self._lock:
+            self._path = path
+            callbacks = list(self._placed)
+        for callback in callbacks:
+            callback(path)
+
+def get_info(url, refresh=False):
+    cache = get_cache()
+    cache_key = extract_video_id(url)
+    if not refresh:
+        info = cache.get(cache_key)
+        if info is not None:
+            get_metrics().emit("fetch", url=url, seconds=0, cached=True, ok=True)
+            return info
+    return _fetches.run(cache_key, lambda: _fetch_info(url, cache_key))
+
+def _fetch_info(url, cache_key):
+    cache = get_cache()
+    started = time.monotonic()
     try:
-        return json.loads(stdout)
-    except json.JSONDecodeError as e:
-        print_error(e)
+        info = get_retry_policy().call(
+            # The info is cached under the video ID, so the plain video URL
+            # is looked up rather than whatever else the URL names
+            lambda: get_engine().extract_info(canonical_url(url)), url, EngineError, "Fetching information"
+        )
+    except EngineError as e:
+        get_metrics().emit("fetch", url=url, seconds=round(time.monotonic() - started, 3), cached=False, ok=False)
+        print_error(f"yt-dlp: {e}")
         return None
 
-def display_width(text):
-    return sum(wcwidth.wcwidth(char) for char in str(text))
-
-def truncate_text(text, max_display_width):
-    text = str(text)
-    current_width = 0
-    result_chars = []
-    
-    for char in text:
-        char_width = wcwidth.wcwidth(char)
-        if current_width + char_width > max_display_width - 3:
-            result_chars.append("...")
-            break
-        result_chars.append(char)
-        current_width += char_width
-    
-    return ''.join(result_chars)
+    get_metrics().emit("fetch", url=url, seconds=round(time.monotonic() - started, 3), cached=False, ok=True)
+    cache.put(cache_key, info)
+    return info
 
 def display_info_box(info_data, title="INFORMATION"):
     if not info_data:
@@ -62,29 +108,26 @@ def display_info_box(info_data, title="INFORMATION"):
         return
     
     # Calculate dimensions
-    max_label_width = max(display_width(label) for label, _ in info_data)
+    label_widths = [display_width(label) for label, _ in info_data]
+    max_label_width = max(label_widths)
     box_width = min(MAX_BOX_WIDTH, max(60, max_label_width + 60))
-    
-    # Print box
-    print("┌" + "─" * box_width + "┐")
-    print("│" + title.center(box_width) + "│")
-    print("├" + "─" * box_width + "┤")
-    
-    for label, value in info_data:
-        available_width = box_width - max_label_width - 5
-        display_value = truncate_text(value, available_width)
-        
-        label_str = str(label)
-        value_str = str(display_value)
-        
-        label_padding = max_label_width - display_width(label)
-        line = f"│ {label_str}{' ' * label_padding} : {value_str}"
-        
-        current_line_width = display_width(line) - 1
-        right_padding = box_width - current_line_width
-        print(line + ' ' * right_padding + "│")
-    
-    print("└" + "─" * box_width + "┘")
+    available_width = box_width - max_label_width - 5
+
+    lines = [
+        "┌" + "─" * box_width + "┐",
+        "│" + title.center(box_width) + "│",
+        "├" + "─" * box_width + "┤",
+    ]
+    for (label, value), label_width in zip(info_data, label_widths):
+        # Each width is measured once: "│ label : value", padded to the border
+        value_str, value_width = fit(value, available_width)
+        label_padding = max_label_width - label_width
+        right_padding = box_width - (max_label_width + value_width + 4)
+        lines.append(f"│ {label}{' ' * label_padding} : {value_str}{' ' * right_padding}│")
+    lines.append("└" + "─" * box_width + "┘")
+
+    # One write for the whole box
+    print("\n".join(lines))
 
 def get_video_info_data(info_dict):
     if not isinstance(info_dict, dict) or not info_dict:
@@ -106,89 +149,70 @@ def get_video_info_data(info_dict):
 def format_filesize(size_bytes):
     if not size_bytes or size_bytes == 0:
         return "unknown"
-    return f"{size_bytes / (1024*1024):.1f} MB"
+    return format_size(size_bytes)
 
 def get_best_formats(formats, extensions, is_audio=False):
-    available_formats = []
-    format_groups = {}
-    
-    for fmt in formats:
-        ext = fmt.get('ext', '')
-        has_content = (fmt.get('acodec') != 'none' if is_audio 
-                      else fmt.get('vcodec') != 'none')
-        
-        if not ext or ext not in extensions or not has_content:
-            continue
-        
+    if is_audio:
+        return rank_formats(formats, (), extensions)[1]
+    # Video-only formats are offered together with a matching audio stream
+    # when ffmpeg is there to merge them
+    if not can_merge():
+        return rank_formats(formats, extensions, ())[0]
+    video, audio = rank_formats(formats, extensions, AUDIO_EXTENSIONS)
+    return pair_formats(video, audio)
 
-        abr = fmt.get('abr', 0)
-        height = fmt.get('height', 0)
+def select_format(formats, quality="best", is_audio=False, target_codec=""):
+    """Picks a format from the get_best_formats ranking.
 
-        # Create grouping key
-        if is_audio:
-            key = f"{int(abr)}kbps_{ext}_{fmt.get('acodec', '')[:10]}"
-        else:
-            key = f"{height}p_{ext}_{fmt.get('vcodec', '')[:10]}"
-        
-        if key not in format_groups:
-            format_groups[key] = []
-        
-        format_info = {
-            'format_id': fmt.get('format_id', ''),
-            'ext': ext,
-            'filesize': fmt.get('filesize') or fmt.get('filesize_approx', 0),
-            'protocol': fmt.get('protocol', '')
-        }
-        
-        # Add audio/video specific fields
-        if is_audio:
-            format_info.update({
-                'abr': abr,
-                'asr': fmt.get('asr', 0),
-                'acodec': fmt.get('acodec', '')
-            })
-        else:
-            format_info.update({
-                'resolution': fmt.get('resolution', 'unknown'),
-                'height': height,
-                'vcodec': fmt.get('vcodec', '')
-            })
-        
-        format_groups[key].append(format_info)
-    
-    # Select best format from each group (prefer http/https)
-    for formats_list in format_groups.values():
-        formats_list.sort(key=lambda x: (
-            0 if 'https' in x['protocol'] or 'http' in x['protocol'] else 1
-        ))
-            
-        available_formats.append(formats_list[0])
-    
-    # Sort by quality (bitrate for audio, height for video)
-    sort_key = 'abr' if is_audio else 'height'
-    available_formats.sort(key=lambda x: x[sort_key], reverse=True)
-    
-    return available_formats
+    quality is "best", "worst", a number (the highest height for video or
+    bitrate in kbps for audio that does not exceed it) or a QualityPolicy
+    such as "max_height=1080,codecs=av01>vp9>avc1,https,max_size=500M".
+    With an audio target_codec, streams that only need a remux to reach it
+    are preferred over ones that would have to be re-encoded.
+    """
+    if not formats:
+        return None
+    policy = QualityPolicy.parse(quality)
+    if is_audio and target_codec:
+        remuxable = [fmt for fmt in formats if can_remux(fmt, target_codec)]
+        selected = policy.select(remuxable, is_audio)
+        if selected is not None:
+            return selected
+    selected = policy.select(formats, is_audio)
+    if selected is None and is_number(quality):
+        # Nothing that small: settle for the lowest quality available
+        return formats[-1]
+    return selected
+
+def is_number(text):
+    try:
+        float(text)
+        return True
+    except (TypeError, ValueError):
+        return False
 
-def display_formats(formats, is_audio=False):
+def display_formats(formats, is_audio=False, target_codec=""):
     if not formats:
         print_error("No suitable formats available")
         return
     
-    print("Available formats:" if not is_audio else "Available audio formats:")
-    print("—" * 60)
-    
+    lines = ["Available formats:" if not is_audio else "Available audio formats:", "—" * 60]
     for idx, fmt in enumerate(formats, 1):
         size_str = format_filesize(fmt['filesize'])
         
         if is_audio:
             bitrate = f"{int(fmt['abr'])}kbps" if fmt['abr'] > 0 else 'unknown'
             sample_rate = f"{fmt['asr']}Hz" if fmt['asr'] > 0 else ''
-            print(f"{idx}. {bitrate} {sample_rate} [{fmt['ext'].upper()}] - {size_str} - {fmt['acodec']}")
+            conversion = conversion_for(fmt, target_codec)
+            target = f" -> {target_codec} ({conversion})" if conversion else ""
+            lines.append(f"{idx}. {bitrate} {sample_rate} [{fmt['ext'].upper()}] - {size_str} - {fmt['acodec']}{target}")
         else:
-            print(f"{idx}. {fmt['resolution']} [{fmt['ext'].upper()}] - {size_str} - {fmt['vcodec']}")
-    
-    print("—" * 60)
+            codecs = f"{fmt['vcodec']} + {fmt['acodec']}" if is_merged(fmt) else fmt['vcodec']
+            lines.append(f"{idx}. {fmt['resolution']} [{fmt['ext'].upper()}] - {size_str} - {codecs}")
+    lines.append("—" * 60)
+
+    # Hundreds of rows go out in one write instead of one per row
+    print("\n".join(lines))
 
 def get_user_choice(formats):
     while True:
@@ -215,132 +239,234 @@ def get_user_choice(formats):
             print_red("Operation cancelled by user")
             return None
 
-def download_content(
+def _finished(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def start_download(url, selected_format, content_type="Video", *args, **kwargs):
+    """Downloads selected_format and hands the file to the post-processing
+    pool if streams have to be merged, audio converted or tags and the
+    thumbnail embedded.
+
+    Returns once the network part is done, with a Future that resolves to
+    True or False when the whole download, post-processing included, is
+    finished. The download stays in the journal until then, so it can be
+    resumed after a crash; callers that persist their jobs themselves pass
+    journal=False, save the directory passed to placed(path) before the
+    download starts, and pass it back as download_path when resuming.
+
+    While a video is being downloaded as content_type in the same format,
+    starting it again returns the running download's Future right away.
+    The caller's progress and placed callbacks are hooked into the running
+    download; its other settings (download_path, rate_limit, ...) are
+    those of the caller that started it, and if that caller let yt-dlp
+    draw its own progress bar, there are no progress events to pass on.
+    """
+    progress = kwargs.pop('progress', None)
+    placed = kwargs.pop('placed', None)
+    video_id = extract_video_id(url)
+    listeners = _Listeners()
+    listeners.add(progress, placed)
+    future, running = _downloads.share(
+        (video_id, content_type, selected_format['format_id']) if video_id else None,
+        lambda: _start_download(url, selected_format, content_type, *args,
+                                progress=listeners.progress if progress else None,
+                                placed=listeners.placed, **kwargs),
+        listeners
+    )
+    if running is not listeners:
+        running.add(progress, placed, joined=True)
+    return future
+
+def _start_download(
         url,
         selected_format,
         content_type="Video",
-        config=None
+        config=None,
+        quiet=False,
+        rate_limit=None,
+        progress=None,
+        journal=True,
+        download_path=None,
+        placed=None
     ):
     if config is None:
         print_error("Configuration not provided to download_content.")
-        return False
+        return _finished(False)
     
-    download_path = config.get("download_path", "/sdcard/Download/YouTubeDownload/")
+    # A download that ran before goes back to the directory holding its
+    # part files
+    targets = [download_path] if download_path else download_paths(config) or ["/sdcard/Download/YouTubeDownload/"]
     filename_template = config.get("filename_template", "%(title)s.%(ext)s")
     embed_thumbnail = config.get("embed_thumbnail", True)
     embed_metadata = config.get("embed_metadata", True)
+    target_codec = config.get("target_codec", "") if content_type == "Audio" else ""
+    has_ffmpeg = ffmpeg_available()
+    if not has_ffmpeg:
+        # Converting needs ffmpeg; the downloaded stream is kept as it is
+        # (main warns about this once at startup)
+        target_codec = ""
+    conversion = conversion_for(selected_format, target_codec)
 
-    # Display selection info
-    if content_type == "Audio":
+    # Display selection info (background jobs announce themselves instead)
+    if quiet:
+        pass
+    elif content_type == "Audio":
         bitrate = f"{int(selected_format['abr'])}kbps" if selected_format['abr'] > 0 else 'unknown'
-        print(f"Selected: {bitrate} - {selected_format['ext']}")
+        target = f" -> {target_codec} ({conversion})" if conversion else ""
+        print(f"Selected: {bitrate} - {selected_format['ext']}{target}")
     else:
-        print(f"Selected: {selected_format['resolution']} - {selected_format['ext']}")
-    
-    # Build download command
-    download_command = [
-        "yt-dlp",
-        "-c",
-        url,
-        "-f", selected_format['format_id'],
-        "-o", os.path.join(download_path, filename_template)
-    ]
+        merged = " (video + audio)" if is_merged(selected_format) else ""
+        print(f"Selected: {selected_format['resolution']} - {selected_format['ext']}{merged}")
+    
+    # Tags and the thumbnail are embedded by the post-processing pass, which
+    # needs ffmpeg; only embed thumbnail if the final format supports it
+    final_ext = AUDIO_TARGETS[target_codec][0] if conversion else selected_format['ext']
+    if not has_ffmpeg:
+        embed_thumbnail = embed_metadata = False
+    if embed_thumbnail and final_ext not in THUMBNAIL_EMBED_SUPPORTED_EXTENSIONS:
+        print_warning(f"Thumbnail embedding not supported for .{final_ext} format. Skipping.")
+        embed_thumbnail = False
+
+    # Room for the file, twice over if ffmpeg rewrites it, is reserved on
+    # one of the download paths before anything is written
+    rewrite = bool(is_merged(selected_format) or conversion or embed_metadata or embed_thumbnail)
+    try:
+        reservation = get_storage().reserve(targets, selected_format.get('filesize'), rewrite)
+    except StorageError as e:
+        print_error(e)
+        return _finished(False)
+    download_path = reservation.path
+    if placed:
+        placed(download_path)
+
+    options = {
+        'format': selected_format['format_id'],
+        'outtmpl': os.path.join(download_path, filename_template),
+        'write_thumbnail': embed_thumbnail,
+        'quiet': quiet,
+        'concurrent_fragments': config.get("concurrent_fragments", 1),
+        'external_downloader': config.get("external_downloader", ""),
+        'external_downloader_args': config.get("external_downloader_args", ""),
+        'http_chunk_size': config.get("http_chunk_size", ""),
+        'rate_limit': rate_limit
+    }
+
+    journal_key = get_journal().begin(
+        url, content_type, selected_format, download_path, filename_template
+    ) if journal else None
+
+    def on_progress(event):
+        get_journal().note_progress(journal_key, event)
+        reservation.note_progress(event)
+        if progress:
+            progress(event)
 
-    if embed_metadata:
-        download_command.append("--embed-metadata")
-    
-    # Only embed thumbnail if the format supports it
-    if embed_thumbnail and selected_format['ext'] in THUMBNAIL_EMBED_SUPPORTED_EXTENSIONS:
-        download_command.append("--embed-thumbnail")
-    elif embed_thumbnail and selected_format['ext'] not in THUMBNAIL_EMBED_SUPPORTED_EXTENSIONS:
-        print_warning(f"Thumbnail embedding not supported for .{selected_format['ext']} format. Skipping.")
-    
     # Execute download
+    # Without a callback or metrics the engine is left to draw its own
+    # progress bar
+    timer = DownloadTimer(on_progress)
+    callback = timer if progress or get_metrics().enabled else None
+    metric_fields = {'url': url, 'content_type': content_type, 'format_id': selected_format['format_id']}
     try:
-        result = subprocess.run(download_command, check=True)
-        if result.returncode == 0:
-            print_success(f"Downloaded {content_type} to {download_path}")
-            return True
+        if is_merged(selected_format):
+            result, audio_result = download_merged(url, selected_format, options, progress=callback)
+            inputs = [result['filepath'], audio_result['filepath']]
         else:
-            print_error("Download failed")
-            return False
-    except subprocess.CalledProcessError:
+            result = get_retry_policy().call(
+                lambda: get_engine().download(url, options, progress=callback),
+                url, EngineError, "Download"
+            )
+            inputs = [result['filepath']]
+    except EngineError:
+        get_journal().end(journal_key)
+        reservation.release()
+        get_metrics().emit("download", ok=False, **metric_fields, **timer.fields())
         print_error("Download process failed")
-        return False
+        return _finished(False)
     except KeyboardInterrupt:
+        # Left in the journal, so it is offered for resuming next time
+        reservation.release()
         print_red("Download cancelled by user")
-        return False
+        return _finished(False)
+    get_metrics().emit("download", ok=True, **metric_fields, **timer.fields())
 
-def download_video(url, config=None):
-    if config is None:
-        print_error("Configuration not provided to download_video.")
-        return
-    
-    start_loading()
-    info = get_info(url)
-    stop_loading()
-    
-    if not info:
-        print_error("Failed to get video information")
-        return
-    
-    # Get available formats
-    available_formats = get_best_formats(info.get('formats', []), VIDEO_EXTENSIONS)
-    
-    if not available_formats:
-        print_error("No suitable video formats available")
-        return
-    
-    # Display information and formats
-    info_data = get_video_info_data(info)
-    if info_data:
-        display_info_box(info_data)
-    
-    display_formats(available_formats)
-    
-    # Get user choice and download
-    choice_idx = get_user_choice(available_formats)
-    if choice_idx is not None:
-        download_content(
-            url,
-            available_formats[choice_idx],
-            "Video",
-            config
-        )
+    tags = metadata_tags(result) if embed_metadata else None
+    thumbnail = result['thumbnail_path'] if embed_thumbnail else None
+    needs_pass = is_merged(selected_format) or conversion or tags or thumbnail
 
-def download_audio(url, config=None):
-    if config is None:
-        print_error("Configuration not provided to download_audio.")
-        return
-    
-    start_loading()
-    info = get_info(url)
-    stop_loading()
-    
+    def finish():
+        try:
+            return postprocess()
+        finally:
+            get_journal().end(journal_key)
+            reservation.release()
+
+    def postprocess():
+        if needs_pass:
+            if progress:
+                progress({'stage': "postprocess", 'status': "started", 'postprocessor': "FFmpeg"})
+            started = time.monotonic()
+            try:
+                if not all(inputs):
+                    raise EngineError("yt-dlp did not report where the file was saved")
+                if is_merged(selected_format):
+                    output_path = merged_path(inputs[0], selected_format['video_format']['format_id'], final_ext)
+                else:
+                    output_path = f"{os.path.splitext(inputs[0])[0]}.{final_ext}"
+                finalize_file(
+                    inputs,
+                    output_path,
+                    tags=tags,
+                    thumbnail=thumbnail,
+                    audio_args=AUDIO_TARGETS[target_codec][2] if conversion == "transcode" else None,
+                    audio_only=content_type == "Audio"
+                )
+            except (EngineError, OSError) as e:
+                get_metrics().emit("postprocess", url=url, seconds=round(time.monotonic() - started, 3), ok=False)
+                print_error(f"Post-processing failed: {e}")
+                return False
+            get_metrics().emit("postprocess", url=url, seconds=round(time.monotonic() - started, 3), ok=True)
+            if progress:
+                progress({'stage': "postprocess", 'status': "finished", 'postprocessor': "FFmpeg"})
+        record_download(url, content_type, selected_format['format_id'])
+        print_success(f"Downloaded {content_type} to {download_path}")
+        return True
+
+    # Post-processing gets its own pool so the caller can start the next
+    # download right away
+    if needs_pass:
+        return get_postprocess_pool().submit(finish)
+    return _finished(finish())
+
+def download_content(*args, **kwargs):
+    """Like start_download, but waits for post-processing and returns
+    True or False."""
+    return start_download(*args, **kwargs).result()
+
+def choose_format(info, is_audio=False, target_codec=""):
+    content = "audio" if is_audio else "video"
     if not info:
-        print_error("Failed to get audio information")
-        return
+        print_error(f"Failed to get {content} information")
+        return None
     
     # Get available formats
-    available_formats = get_best_formats(info.get('formats', []), AUDIO_EXTENSIONS, is_audio=True)
+    extensions = AUDIO_EXTENSIONS if is_audio else VIDEO_EXTENSIONS
+    available_formats = get_best_formats(info.get('formats', []), extensions, is_audio=is_audio)
     
     if not available_formats:
-        print_error("No suitable audio formats available")
-        return
+        print_error(f"No suitable {content} formats available")
+        return None
     
     # Display information and formats
     info_data = get_video_info_data(info)
     if info_data:
         display_info_box(info_data)
     
-    display_formats(available_formats, is_audio=True)
+    display_formats(available_formats, is_audio=is_audio, target_codec=target_codec)
     
-    # Get user choice and download
     choice_idx = get_user_choice(available_formats)
-    if choice_idx is not None:
-        download_content(
-            url,
-            available_formats[choice_idx],
-            "Audio",
-            config
-        )
+    if choice_idx is None:
+        return None
+    return available_formats[choice_idx]
@@ -0,0 +1,418 @@
+import importlib.util
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+from ndjson import iter_json_lines, slim_entry, slim_info
+
+# Engines run yt-dlp either in-process through a long-lived yt_dlp.YoutubeDL
+# or by forking the yt-dlp CLI. Both take the same download options:
+#   format, outtmpl, write_thumbnail, quiet, concurrent_fragments,
+#   external_downloader, external_downloader_args, http_chunk_size,
+#   rate_limit
+#
+# download() can also report progress to a callback, which receives events
+# built by progress_event(): {'stage': 'download' | 'postprocess', ...}, and
+# {'stage': 'retry', 'message': ...} whenever yt-dlp retries a fragment (or
+# the whole file for formats without fragments).
+# It returns a dict with RESULT_FIELDS of the finished download: 'filepath'
+# and the details postprocess.py embeds as tags. Thumbnails are written as
+# jpg next to the file ('thumbnail_path') and never embedded by yt-dlp;
+# that happens in the post-processing pass.
+
+PROGRESS_FIELDS = (
+    "status", "downloaded_bytes", "total_bytes", "total_bytes_estimate",
+    "speed", "eta", "elapsed", "fragment_index", "fragment_count",
+    "filename", "tmpfilename", "postprocessor",
+)
+PROGRESS_PREFIX = "[ytd-progress] "
+RETRY_PATTERN = re.compile(r"Retrying(?: fragments?(?: \d+)?)? \(\d+/\d+\)")
+RESULT_FIELDS = (
+    "filepath", "title", "channel", "uploader", "upload_date",
+    "description", "webpage_url", "thumbnails",
+)
+
+class EngineError(Exception):
+    pass
+
+def progress_event(stage, status):
+    event = {key: status[key] for key in PROGRESS_FIELDS if key in status}
+    event['stage'] = stage
+    return event
+
+def retry_event(message):
+    return {'stage': "retry", 'message': message.strip()}
+
+def download_result(info):
+    result = {key: info.get(key) for key in RESULT_FIELDS}
+    # Only the thumbnail that was written to disk has a filepath
+    written = [t['filepath'] for t in result.pop('thumbnails') or [] if t.get('filepath')]
+    result['thumbnail_path'] = written[-1] if written else None
+    return result
+
+def build_download_command(url, options):
+    command = [
+        "yt-dlp",
+        "-c",
+        "--no-playlist",
+        url,
+        "-f", options['format'],
+        "-o", options['outtmpl']
+    ]
+
+    if options.get('quiet'):
+        command.extend(["--quiet", "--no-warnings"])
+    if options.get('concurrent_fragments', 1) > 1:
+        command.extend(["-N", str(options['concurrent_fragments'])])
+    if options.get('external_downloader'):
+        command.extend(["--downloader", options['external_downloader']])
+        if options.get('external_downloader_args'):
+            command.extend([
+                "--downloader-args",
+                f"{options['external_downloader']}:{options['external_downloader_args']}"
+            ])
+    if options.get('http_chunk_size'):
+        command.extend(["--http-chunk-size", str(options['http_chunk_size'])])
+    if options.get('rate_limit'):
+        command.extend(["--limit-rate", str(int(options['rate_limit']))])
+    if options.get('write_thumbnail'):
+        command.extend(["--write-thumbnail", "--convert-thumbnails", "jpg"])
+
+    return command
+
+class SubprocessEngine:
+    name = "subprocess"
+
+    def _stream_json(self, command, slim):
+        # stderr goes to a file: a pipe nobody reads could fill up and stall
+        # yt-dlp halfway through a long playlist
+        with tempfile.TemporaryFile(mode='w+') as stderr:
+            try:
+                process = subprocess.Popen(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=stderr,
+                    text=True
+                )
+            except OSError as e:
+                raise EngineError(f"yt-dlp: {e}") from e
+
+            try:
+                yield from iter_json_lines(process.stdout, slim)
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    raise EngineError(stderr.read().strip() or f"yt-dlp exited with status {process.returncode}")
+            except json.JSONDecodeError as e:
+                raise EngineError(e) from e
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+    def extract_info(self, url):
+        # Only the first info dict is wanted; closing the stream stops yt-dlp
+        # --no-playlist: watch?v=ID&list=... is the video, not its playlist
+        stream = self._stream_json(["yt-dlp", "--no-playlist", url, "--dump-json"], slim_info)
+        try:
+            for info in stream:
+                return info
+        finally:
+            stream.close()
+        raise EngineError("No output received from yt-dlp")
+
+    def iter_flat_entries(self, url):
+        # --flat-playlist prints one entry per line as soon as each page of
+        # the playlist is fetched
+        yield from self._stream_json(["yt-dlp", "--flat-playlist", "--dump-json", url], slim_entry)
+
+    def download(self, url, options, progress=None):
+        command = build_download_command(url, options)
+        if progress is not None:
+            # Retries are only reported as regular output, which --quiet
+            # hides, so quiet runs drop the other output lines themselves
+            if options.get('quiet'):
+                command = build_download_command(url, dict(options, quiet=False)) + ["--no-warnings"]
+            # Progress comes back as JSON lines marked with PROGRESS_PREFIX,
+            # on stdout or stderr, so both streams are read together.
+            command.extend([
+                "--newline", "--progress",
+                "--progress-template", f"download:{PROGRESS_PREFIX}%(progress)j",
+                "--progress-template", f"postprocess:{PROGRESS_PREFIX}%(progress)j",
+            ])
+
+        # The result is written to a side file rather than stdout, which is
+        # either the terminal or the progress stream
+        with tempfile.TemporaryDirectory() as tmp:
+            result_file = os.path.join(tmp, "result")
+            command.extend([
+                "--print-to-file", f"after_move:%(.{{{','.join(RESULT_FIELDS)}}})j", result_file
+            ])
+            self._run_download(command, options, progress)
+            try:
+                with open(result_file, encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                lines = []
+        return download_result(json.loads(lines[-1]) if lines else {})
+
+    def _run_download(self, command, options, progress):
+        # Without a callback stdout stays on the terminal so yt-dlp can draw
+        # its own progress bar; stderr is still read to keep the error text
+        try:
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE if progress else None,
+                stderr=subprocess.STDOUT if progress else subprocess.PIPE,
+                text=True
+            )
+        except OSError as e:
+            raise EngineError(f"yt-dlp: {e}") from e
+
+        stream = process.stdout if progress else process.stderr
+        passthrough = sys.stdout if progress and not options.get('quiet') else sys.stderr
+        errors = []
+        try:
+            for line in stream:
+                if progress and line.startswith(PROGRESS_PREFIX):
+                    status = json.loads(line[len(PROGRESS_PREFIX):])
+                    stage = "postprocess" if "postprocessor" in status else "download"
+                    progress(progress_event(stage, status))
+                    continue
+                if progress and RETRY_PATTERN.search(line):
+                    progress(retry_event(line))
+                if line.startswith("ERROR:"):
+                    errors.append(line.strip())
+                elif progress and options.get('quiet'):
+                    continue
+                passthrough.write(line)
+            if process.wait() != 0:
+                raise EngineError("\n".join(errors) or f"yt-dlp exited with status {process.returncode}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            stream.close()
+
+class _SilentLogger:
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+class _RetryLogger(_SilentLogger):
+    # Quiet sessions get this logger, which yt-dlp also hands its screen
+    # output; retry notices are passed on as progress events
+    def __init__(self, progress_switch):
+        self.progress_switch = progress_switch
+
+    def debug(self, msg):
+        if RETRY_PATTERN.search(msg):
+            self.progress_switch.retry(msg)
+
+    def warning(self, msg):
+        self.debug(msg)
+
+class _FormatSwitch:
+    # YoutubeDL builds its format selector once in __init__, so pooled
+    # instances are given this callable and pointed at a new selector per job
+    def __init__(self):
+        self.selector = None
+
+    def __call__(self, ctx):
+        return self.selector(ctx)
+
+class _ProgressSwitch:
+    # Like _FormatSwitch: hooks are registered once per YoutubeDL instance and
+    # forward to whichever callback the current job passed in
+    def __init__(self):
+        self.callback = None
+
+    def download_hook(self, status):
+        if self.callback:
+            self.callback(progress_event("download", status))
+
+    def postprocessor_hook(self, status):
+        if self.callback:
+            self.callback(progress_event("postprocess", status))
+
+    def retry(self, message):
+        if self.callback:
+            self.callback(retry_event(message))
+
+class _DownloadSession:
+    def __init__(self, yt_dlp, params):
+        self.format_switch = _FormatSwitch()
+        self.progress_switch = _ProgressSwitch()
+        params.update({
+            'format': self.format_switch,
+            'progress_hooks': [self.progress_switch.download_hook],
+            'postprocessor_hooks': [self.progress_switch.postprocessor_hook],
+        })
+        if params.get('quiet'):
+            params['logger'] = _RetryLogger(self.progress_switch)
+        self.ydl = yt_dlp.YoutubeDL(params)
+
+class YoutubeDLEngine:
+    name = "yt_dlp"
+
+    def __init__(self):
+        if importlib.util.find_spec("yt_dlp") is None:
+            raise ImportError("No module named 'yt_dlp'")
+        self._module = None
+        self._lock = threading.Lock()
+        # Idle YoutubeDL instances keyed by their params. Reusing them keeps
+        # extractor instances, cookies and HTTP connections warm between calls.
+        self._idle = {}
+
+    def load(self):
+        # yt_dlp takes longer to import than the rest of the program takes to
+        # start, so it is imported by the first call that needs it
+        if self._module is None:
+            import yt_dlp
+            self._module = yt_dlp
+        return self._module
+
+    @property
+    def _yt_dlp(self):
+        return self.load()
+
+    def _acquire(self, key, create):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return create()
+
+    def _release(self, key, session):
+        with self._lock:
+            self._idle.setdefault(key, []).append(session)
+
+    def extract_info(self, url):
+        key = ("info",)
+        ydl = self._acquire(key, lambda: self._yt_dlp.YoutubeDL({
+            'quiet': True,
+            'no_warnings': True,
+            'noplaylist': True,
+            'logger': _SilentLogger(),
+        }))
+        try:
+            info = slim_info(ydl.sanitize_info(ydl.extract_info(url, download=False)))
+        except self._yt_dlp.utils.YoutubeDLError as e:
+            raise EngineError(str(e)) from e
+        finally:
+            self._release(key, ydl)
+
+        # Match the CLI's --dump-json output, which carries the version
+        info.setdefault('_version', {'version': self._yt_dlp.version.__version__})
+        return info
+
+    def iter_flat_entries(self, url):
+        key = ("flat",)
+        ydl = self._acquire(key, lambda: self._yt_dlp.YoutubeDL({
+            'quiet': True,
+            'no_warnings': True,
+            'logger': _SilentLogger(),
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+        }))
+        try:
+            # process=False hands back the extractor's own entries generator,
+            # which fetches playlist pages only as they are consumed
+            result = ydl.extract_info(url, download=False, process=False)
+            if result.get('_type') in ('playlist', 'multi_video'):
+                for entry in result.get('entries') or []:
+                    if entry:
+                        yield slim_entry(entry)
+            else:
+                result.setdefault('webpage_url', url)
+                yield slim_entry(result)
+        except self._yt_dlp.utils.YoutubeDLError as e:
+            raise EngineError(str(e)) from e
+        finally:
+            self._release(key, ydl)
+
+    def _download_params(self, options):
+        postprocessors = []
+        if options.get('write_thumbnail'):
+            postprocessors.append({'key': 'FFmpegThumbnailsConvertor', 'format': 'jpg', 'when': 'before_dl'})
+
+        params = {
+            'outtmpl': options['outtmpl'],
+            'continuedl': True,
+            'noplaylist': True,
+            'writethumbnail': bool(options.get('write_thumbnail')),
+            'postprocessors': postprocessors,
+        }
+        if options.get('quiet'):
+            params.update({'quiet': True, 'no_warnings': True, 'noprogress': True})
+        if options.get('concurrent_fragments', 1) > 1:
+            params['concurrent_fragment_downloads'] = options['concurrent_fragments']
+        if options.get('external_downloader'):
+            params['external_downloader'] = {'default': options['external_downloader']}
+            if options.get('external_downloader_args'):
+                params['external_downloader_args'] = {
+                    options['external_downloader']: shlex.split(options['external_downloader_args'])
+                }
+        if options.get('http_chunk_size'):
+            params['http_chunk_size'] = self._yt_dlp.utils.parse_bytes(str(options['http_chunk_size']))
+        if options.get('rate_limit'):
+            params['ratelimit'] = int(options['rate_limit'])
+        return params
+
+    def download(self, url, options, progress=None):
+        key = tuple(sorted((k, v) for k, v in options.items() if k != 'format'))
+        session = self._acquire(
+            key, lambda: _DownloadSession(self._yt_dlp, self._download_params(options))
+        )
+        try:
+            session.format_switch.selector = session.ydl.build_format_selector(options['format'])
+            session.progress_switch.callback = progress
+            info = session.ydl.extract_info(url, download=True)
+        except self._yt_dlp.utils.YoutubeDLError as e:
+            raise EngineError(str(e)) from e
+        finally:
+            session.progress_switch.callback = None
+            self._release(key, session)
+
+        # requested_downloads only keeps download details, the tags and
+        # written thumbnails are on the info itself
+        info = info or {}
+        downloads = info.get('requested_downloads') or [{}]
+        return download_result(dict(info, filepath=downloads[-1].get('filepath')))
+
+def create_engine(backend="auto"):
+    if backend == "subprocess":
+        return SubprocessEngine()
+
+    try:
+        return YoutubeDLEngine()
+    except ImportError:
+        if backend != "auto":
+            raise
+        return SubprocessEngine()
+
+_engine = None
+
+def configure_engine(settings):
+    global _engine
+    settings = settings or {}
+    _engine = create_engine(settings.get("backend", "auto"))
+    return _engine
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_engine()
+    return _engine
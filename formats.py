@@ -0,0 +1,301 @@
+import re
+
+VIDEO_EXTENSIONS = ["webm", "mp4", "mkv", "mov"]
+AUDIO_EXTENSIONS = ["m4a", "mp3", "opus", "webm", "aac"]
+
+class FormatRecord:
+    """Compact view of one yt-dlp format, built once per ranking pass."""
+
+    __slots__ = (
+        "format_id", "ext", "protocol", "filesize", "http_rank",
+        "height", "resolution", "vcodec", "abr", "asr", "acodec",
+    )
+
+    def __init__(self, fmt, ext, protocol):
+        self.format_id = fmt.get('format_id', '')
+        self.ext = ext
+        self.protocol = protocol
+        self.filesize = fmt.get('filesize') or fmt.get('filesize_approx') or 0
+        # Plain http(s) downloads are preferred over manifests
+        self.http_rank = 0 if 'http' in protocol else 1
+        self.height = fmt.get('height') or 0
+        self.resolution = fmt.get('resolution') or 'unknown'
+        self.vcodec = fmt.get('vcodec') or ''
+        self.abr = fmt.get('abr') or 0
+        self.asr = fmt.get('asr') or 0
+        self.acodec = fmt.get('acodec') or ''
+
+    def video_dict(self):
+        return {
+            'format_id': self.format_id,
+            'ext': self.ext,
+            'filesize': self.filesize,
+            'protocol': self.protocol,
+            'resolution': self.resolution,
+            'height': self.height,
+            'vcodec': self.vcodec,
+            'acodec': self.acodec,
+        }
+
+    def audio_dict(self):
+        return {
+            'format_id': self.format_id,
+            'ext': self.ext,
+            'filesize': self.filesize,
+            'protocol': self.protocol,
+            'abr': self.abr,
+            'asr': self.asr,
+            'acodec': self.acodec,
+            'vcodec': self.vcodec,
+        }
+
+def rank_formats(formats, video_extensions=VIDEO_EXTENSIONS, audio_extensions=AUDIO_EXTENSIONS):
+    """Ranks video and audio candidates in a single pass over formats.
+
+    Formats are grouped by (height, ext, codec) for video and (bitrate, ext,
+    codec) for audio; the first http(s) format of each group wins. Returns
+    (video, audio) lists of dicts, best quality first. Pass an empty
+    extension list to skip one side.
+    """
+    video_ext = frozenset(video_extensions)
+    audio_ext = frozenset(audio_extensions)
+    video_groups = {}
+    audio_groups = {}
+    # Formats that carry video too are only used for audio when there is
+    # no audio-only stream, so audio mode never downloads video bytes
+    muxed_audio_groups = {}
+
+    for fmt in formats:
+        ext = fmt.get('ext')
+        if not ext:
+            continue
+        in_video = ext in video_ext and fmt.get('vcodec') != 'none'
+        in_audio = ext in audio_ext and fmt.get('acodec') != 'none'
+        if not (in_video or in_audio):
+            continue
+
+        record = FormatRecord(fmt, ext, fmt.get('protocol') or '')
+        if in_video:
+            key = (record.height, ext, record.vcodec[:10])
+            best = video_groups.get(key)
+            if best is None or record.http_rank < best.http_rank:
+                video_groups[key] = record
+        if in_audio:
+            key = (int(record.abr), ext, record.acodec[:10])
+            groups = audio_groups if record.vcodec == 'none' else muxed_audio_groups
+            best = groups.get(key)
+            if best is None or record.http_rank < best.http_rank:
+                groups[key] = record
+
+    video = sorted(video_groups.values(), key=lambda r: r.height, reverse=True)
+    audio = sorted((audio_groups or muxed_audio_groups).values(), key=lambda r: r.abr, reverse=True)
+    return [r.video_dict() for r in video], [r.audio_dict() for r in audio]
+
+# Audio containers that can be stream-copied into each video container
+# without falling back to mkv
+COMPATIBLE_AUDIO = {
+    "mp4": ("m4a", "mp4", "aac"),
+    "mov": ("m4a", "mp4", "aac"),
+    "webm": ("webm", "opus"),
+}
+
+def merge_container(video_ext, audio_ext):
+    if audio_ext in COMPATIBLE_AUDIO.get(video_ext, ()):
+        return video_ext
+    return "mkv"
+
+def is_merged(fmt):
+    return 'audio_format' in fmt
+
+def pair_formats(video, audio):
+    """Replaces video-only entries of a rank_formats video list with merged
+    video+audio choices (format_id "137+140").
+
+    Each video-only format is paired with the best audio that fits its
+    container, or the best audio overall (merged into mkv). The size shown is
+    the sum of both streams.
+    """
+    if not audio:
+        return video
+
+    paired = []
+    for fmt in video:
+        if fmt['acodec'] != 'none':
+            paired.append(fmt)
+            continue
+
+        compatible = COMPATIBLE_AUDIO.get(fmt['ext'], ())
+        best_audio = next((a for a in audio if a['ext'] in compatible), audio[0])
+        filesize = fmt['filesize'] + best_audio['filesize'] if fmt['filesize'] else 0
+        paired.append(dict(
+            fmt,
+            format_id=f"{fmt['format_id']}+{best_audio['format_id']}",
+            ext=merge_container(fmt['ext'], best_audio['ext']),
+            filesize=filesize,
+            acodec=best_audio['acodec'],
+            abr=best_audio['abr'],
+            video_format=fmt,
+            audio_format=best_audio,
+        ))
+    return paired
+
+# Audio target codecs: file extension, source codecs that only need a
+# container remux (stream copy) and the ffmpeg encoder used otherwise
+AUDIO_TARGETS = {
+    "mp3": ("mp3", ("mp3",), ["-c:a", "libmp3lame", "-q:a", "2"]),
+    "m4a": ("m4a", ("mp4a", "aac"), ["-c:a", "aac", "-b:a", "192k"]),
+    "aac": ("m4a", ("mp4a", "aac"), ["-c:a", "aac", "-b:a", "192k"]),
+    "opus": ("opus", ("opus",), ["-c:a", "libopus", "-b:a", "128k"]),
+    "vorbis": ("ogg", ("vorbis",), ["-c:a", "libvorbis", "-q:a", "5"]),
+    "flac": ("flac", ("flac",), ["-c:a", "flac"]),
+    "wav": ("wav", ("pcm",), ["-c:a", "pcm_s16le"]),
+}
+
+def can_remux(fmt, target):
+    """True if fmt reaches the target codec without re-encoding."""
+    if not target:
+        return True
+    return fmt['acodec'].startswith(AUDIO_TARGETS[target][1])
+
+def conversion_for(fmt, target):
+    """Returns None, "remux" or "transcode" for turning fmt into target."""
+    if not target:
+        return None
+    if not can_remux(fmt, target):
+        return "transcode"
+    return None if fmt['ext'] == AUDIO_TARGETS[target][0] else "remux"
+
+SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+def parse_size(value):
+    """Parses 4M, 512K, 1.5G or a plain number of bytes. Empty means no limit."""
+    if value in (None, "", 0):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = SIZE_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid size '{value}'")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+def format_size(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+class QualityPolicy:
+    """Declarative format choice, e.g. "max_height=1080,codecs=av01>vp9>avc1,https,max_size=500M".
+
+    Keys:
+        max_height / min_height   video height limits
+        max_abr / min_abr         audio bitrate limits in kbps
+        codecs                    preferred codecs, best first (prefix match)
+        ext                       preferred containers, best first
+        https                     prefer plain http(s) over manifests
+        max_size                  skip formats larger than this (4M, 1.5G, ...)
+        worst                     pick the lowest quality that passes instead
+
+    Formats failing a limit are dropped. Among the rest quality wins, then
+    codec, container and protocol preference, then the smaller file.
+    """
+
+    def __init__(
+            self,
+            max_height=None,
+            min_height=None,
+            max_abr=None,
+            min_abr=None,
+            codecs=(),
+            ext=(),
+            https=False,
+            max_size=None,
+            worst=False
+        ):
+        self.max_height = max_height
+        self.min_height = min_height
+        self.max_abr = max_abr
+        self.min_abr = min_abr
+        self.codecs = tuple(codecs)
+        self.ext = tuple(ext)
+        self.https = https
+        self.max_size = max_size
+        self.worst = worst
+
+    @classmethod
+    def parse(cls, text):
+        """Parses "best", "worst", a number or a comma-separated policy."""
+        text = str(text).strip()
+        if text in ("", "best"):
+            return cls()
+        if text == "worst":
+            return cls(worst=True)
+        try:
+            # A bare number caps height (video) or bitrate (audio)
+            limit = float(text)
+            return cls(max_height=limit, max_abr=limit)
+        except ValueError:
+            pass
+
+        options = {}
+        for part in text.split(","):
+            key, _, value = part.strip().partition("=")
+            key = key.strip().replace("-", "_")
+            value = value.strip()
+            if key in ("max_height", "min_height", "max_abr", "min_abr"):
+                options[key] = float(value)
+            elif key in ("codecs", "ext"):
+                options[key] = tuple(item.strip() for item in value.split(">") if item.strip())
+            elif key in ("https", "prefer_https"):
+                options['https'] = value.lower() not in ("0", "false", "no")
+            elif key == "max_size":
+                options['max_size'] = parse_size(value)
+            elif key == "worst":
+                options['worst'] = True
+            else:
+                raise ValueError(f"Unknown quality policy option '{key}'")
+        return cls(**options)
+
+    def _allowed(self, fmt, is_audio):
+        if self.max_size and fmt['filesize'] and fmt['filesize'] > self.max_size:
+            return False
+        if is_audio:
+            abr = fmt['abr'] or 0
+            return ((self.max_abr is None or abr <= self.max_abr)
+                    and (self.min_abr is None or abr >= self.min_abr))
+        height = fmt['height'] or 0
+        return ((self.max_height is None or height <= self.max_height)
+                and (self.min_height is None or height >= self.min_height))
+
+    @staticmethod
+    def _preference(value, preferred):
+        for rank, prefix in enumerate(preferred):
+            if value.startswith(prefix):
+                return rank
+        return len(preferred)
+
+    def rank(self, formats, is_audio=False):
+        """Returns the allowed formats (dicts from rank_formats), best first."""
+        quality_key = 'abr' if is_audio else 'height'
+        codec_key = 'acodec' if is_audio else 'vcodec'
+        direction = 1 if self.worst else -1
+
+        def sort_key(fmt):
+            return (
+                direction * (fmt[quality_key] or 0),
+                self._preference(fmt[codec_key] or '', self.codecs),
+                self._preference(fmt['ext'], self.ext),
+                0 if not self.https or 'http' in fmt['protocol'] else 1,
+                fmt['filesize'] or 0,
+            )
+
+        return sorted((fmt for fmt in formats if self._allowed(fmt, is_audio)), key=sort_key)
+
+    def select(self, formats, is_audio=False):
+        ranked = self.rank(formats, is_audio)
+        return ranked[0] if ranked else None
+
+def is_valid_quality(quality):
+    try:
+        QualityPolicy.parse(quality)
+        return True
+    except ValueError:
+        return False
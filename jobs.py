@@ -0,0 +1,399 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from archive import is_archived
+from formats import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, parse_size
+from jsonfile import load_json, save_json
+from loading import get_dashboard
+from urls import canonical_url
+from log import print_cyan
+
+JOBS_FILE = os.path.expanduser("~/.config/YtDownloader/jobs.json")
+
+QUEUED = "queued"
+FETCHING = "fetching"
+DOWNLOADING = "downloading"
+POST_PROCESSING = "post-processing"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (FETCHING, DOWNLOADING, POST_PROCESSING)
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Finished jobs kept in the queue file for listing
+MAX_FINISHED_JOBS = 100
+
+class Job:
+    def __init__(
+            self,
+            job_id,
+            url,
+            content_type="Video",
+            priority=0,
+            quality="best",
+            selected_format=None,
+            force=False
+        ):
+        self.id = job_id
+        self.url = url
+        self.content_type = content_type
+        self.priority = priority
+        self.quality = quality
+        self.selected_format = selected_format
+        # Download even if the archive says it was downloaded before
+        self.force = force
+        # Where the first run put the download, so a resumed job finds its
+        # part files among several download paths
+        self.download_path = None
+        self.state = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+        # Live progress, not persisted
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.speed = None
+        self.eta = None
+        # Dashboard line while the job runs
+        self.task = None
+
+    @property
+    def is_audio(self):
+        return self.content_type == "Audio"
+
+    @property
+    def label(self):
+        fmt = self.selected_format
+        if not fmt:
+            return self.quality
+        if self.is_audio:
+            return f"{int(fmt.get('abr') or 0)}kbps {fmt['ext']}"
+        return f"{fmt.get('resolution', 'unknown')} {fmt['ext']}"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "content_type": self.content_type,
+            "priority": self.priority,
+            "quality": self.quality,
+            "selected_format": self.selected_format,
+            "force": self.force,
+            "download_path": self.download_path,
+            "state": self.state,
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+    def status_dict(self):
+        """to_dict() plus live progress, for the API."""
+        status = self.to_dict()
+        status.update({
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "speed": self.speed,
+            "eta": self.eta,
+        })
+        return status
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(
+            data["id"],
+            data["url"],
+            data.get("content_type", "Video"),
+            data.get("priority", 0),
+            data.get("quality", "best"),
+            data.get("selected_format"),
+            data.get("force", False),
+        )
+        job.state = data.get("state", QUEUED)
+        job.download_path = data.get("download_path")
+        job.error = data.get("error")
+        job.created = data.get("created", job.created)
+        job.updated = data.get("updated", job.created)
+        return job
+
+class JobQueue:
+    """Persistent download queue with priorities and a shared rate budget.
+
+    Higher priority jobs start first, at most max_parallel run at once and
+    each active job gets an equal share of rate_limit, so together they
+    never exceed it. Jobs interrupted by a restart are queued again and
+    yt-dlp's -c picks up their partial files.
+    """
+
+    def __init__(self, config, path=JOBS_FILE, max_parallel=2, rate_limit=None):
+        self.config = config
+        self.path = path
+        self.max_parallel = max(1, max_parallel)
+        self.rate_limit = rate_limit
+        self.jobs = {}
+        self._heap = []
+        self._order = itertools.count()
+        self._next_id = 1
+        self._active = 0
+        # Jobs whose download is done but post-processing is not; they no
+        # longer count against max_parallel
+        self._postprocessing = 0
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._load()
+
+    def _load(self):
+        for item in load_json(self.path, "job queue").get("jobs", []):
+            job = Job.from_dict(item)
+            if job.state in ACTIVE_STATES:
+                job.state = QUEUED
+            self.jobs[job.id] = job
+            if job.state == QUEUED:
+                heapq.heappush(self._heap, (-job.priority, next(self._order), job))
+        self._next_id = max(self.jobs, default=0) + 1
+
+    def _save(self):
+        # Called with self._cond held
+        finished = [job for job in self.jobs.values() if job.state in FINISHED_STATES]
+        finished.sort(key=lambda job: job.updated)
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del self.jobs[job.id]
+        save_json(self.path, {"jobs": [job.to_dict() for job in self.jobs.values()]}, "job queue", indent=4)
+
+    def _set_state(self, job, state, error=None):
+        with self._cond:
+            job.state = state
+            job.error = error
+            job.updated = time.time()
+            self._save()
+            self._cond.notify_all()
+        if job.task:
+            if state in FINISHED_STATES:
+                job.task.finish(state)
+            else:
+                job.task.set_stage(state)
+
+    def submit(
+            self,
+            url,
+            content_type="Video",
+            selected_format=None,
+            quality="best",
+            priority=0,
+            force=False
+        ):
+        """Queues a download, or returns the unfinished job that already
+        downloads the same video as content_type."""
+        return self.submit_many([url], content_type, selected_format, quality, priority, force)[0]
+
+    def submit_many(
+            self,
+            urls,
+            content_type="Video",
+            selected_format=None,
+            quality="best",
+            priority=0,
+            force=False
+        ):
+        """Like submit for several URLs, with one write of the queue file."""
+        jobs = []
+        messages = []
+        added = 0
+        with self._cond:
+            for url in urls:
+                url = canonical_url(url)
+                job = next((job for job in self.jobs.values()
+                            if job.url == url and job.content_type == content_type
+                            and job.state not in FINISHED_STATES), None)
+                if job is not None:
+                    messages.append(f"{url} is already queued as #{job.id}")
+                else:
+                    job = Job(self._next_id, url, content_type, priority, quality, selected_format, force)
+                    self._next_id += 1
+                    self.jobs[job.id] = job
+                    heapq.heappush(self._heap, (-job.priority, next(self._order), job))
+                    messages.append(f"Queued download #{job.id}: {url} ({job.label})")
+                    added += 1
+                jobs.append(job)
+            if added:
+                self._save()
+                self._cond.notify_all()
+        for message in messages:
+            print_cyan(message)
+        return jobs
+
+    def cancel(self, job_id):
+        # Only queued jobs can be cancelled; running downloads finish
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != QUEUED:
+                return False
+        self._set_state(job, CANCELLED)
+        return True
+
+    def status(self, job_id=None):
+        """status_dict() of one job (None if unknown) or of all jobs."""
+        with self._cond:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return job.status_dict() if job else None
+            return [job.status_dict() for job in sorted(self.jobs.values(), key=lambda job: job.id)]
+
+    def pending_count(self):
+        with self._cond:
+            return sum(1 for job in self.jobs.values() if job.state == QUEUED)
+
+    def unfinished(self):
+        with self._cond:
+            return [job for job in self.jobs.values() if job.state in ACTIVE_STATES + (QUEUED,)]
+
+    def job_rate_limit(self):
+        if not self.rate_limit:
+            return None
+        return max(1, self.rate_limit // self.max_parallel)
+
+    def start(self):
+        # The dispatcher runs until the program exits; wait() is how callers
+        # finish a queue
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while self._active >= self.max_parallel or not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.state != QUEUED:
+                    continue
+                self._active += 1
+            threading.Thread(target=self._run, args=(job,), name="queue", daemon=True).start()
+
+    def _placed(self, job, download_path):
+        with self._cond:
+            if job.download_path != download_path:
+                job.download_path = download_path
+                self._save()
+
+    def _on_progress(self, job, event):
+        if event['stage'] == "retry":
+            return
+        if event['stage'] == "postprocess":
+            if job.state != POST_PROCESSING:
+                self._set_state(job, POST_PROCESSING)
+            return
+        job.downloaded_bytes = event.get('downloaded_bytes') or job.downloaded_bytes
+        job.total_bytes = event.get('total_bytes') or event.get('total_bytes_estimate') or job.total_bytes
+        job.speed = event.get('speed')
+        job.eta = event.get('eta')
+        if job.task:
+            job.task.update(event)
+
+    def _run(self, job):
+        # Imported by the first job, so listing or editing the queue and
+        # reaching the interactive menu do not wait for the download stack
+        from download import get_best_formats, get_info, select_format, start_download
+
+        job.task = get_dashboard().add(f"#{job.id} {job.url}")
+        try:
+            if not job.force and is_archived(job.url, job.content_type):
+                self._set_state(job, DONE, "already downloaded")
+                return
+
+            if job.selected_format is None:
+                self._set_state(job, FETCHING)
+                info = get_info(job.url)
+                if not info:
+                    self._set_state(job, FAILED, "failed to get information")
+                    return
+                extensions = AUDIO_EXTENSIONS if job.is_audio else VIDEO_EXTENSIONS
+                formats = get_best_formats(info.get('formats', []), extensions, is_audio=job.is_audio)
+                target_codec = self.config['audio'].get("target_codec", "") if job.is_audio else ""
+                job.selected_format = select_format(formats, job.quality, job.is_audio, target_codec)
+                if job.selected_format is None:
+                    self._set_state(job, FAILED, "no suitable formats")
+                    return
+
+            self._set_state(job, DOWNLOADING)
+            section = self.config['audio' if job.is_audio else 'video']
+            future = start_download(
+                job.url,
+                job.selected_format,
+                job.content_type,
+                section,
+                quiet=True,
+                rate_limit=self.job_rate_limit(),
+                progress=lambda event: self._on_progress(job, event),
+                # The queue file already brings interrupted jobs back
+                journal=False,
+                download_path=job.download_path,
+                placed=lambda path: self._placed(job, path)
+            )
+            with self._cond:
+                self._postprocessing += 1
+            # Registered after this, so the final state always wins
+            if not future.done():
+                self._set_state(job, POST_PROCESSING)
+            future.add_done_callback(lambda future: self._finished(job, future))
+        except Exception as e:
+            self._set_state(job, FAILED, str(e))
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _finished(self, job, future):
+        try:
+            ok = future.result()
+            self._set_state(job, DONE if ok else FAILED, None if ok else "download failed")
+        except Exception as e:
+            self._set_state(job, FAILED, str(e))
+        finally:
+            with self._cond:
+                self._postprocessing -= 1
+                self._cond.notify_all()
+
+    def wait(self):
+        unfinished = self.unfinished()
+        if not unfinished:
+            return
+        print_cyan(f"Waiting for {len(unfinished)} download(s) to finish...")
+        self.start()
+        dashboard = get_dashboard()
+        dashboard.start()
+        try:
+            with self._cond:
+                while (self._active or self._postprocessing
+                       or any(job.state == QUEUED for _, _, job in self._heap)):
+                    self._cond.wait()
+        finally:
+            dashboard.stop()
+
+    def print_jobs(self):
+        with self._cond:
+            jobs = sorted(self.jobs.values(), key=lambda job: job.id)
+        if not jobs:
+            print("No downloads yet")
+            return
+
+        lines = ["—" * 60]
+        for job in jobs:
+            detail = job.error or ""
+            if job.state == DOWNLOADING and job.total_bytes:
+                detail = f"{job.downloaded_bytes * 100 / job.total_bytes:5.1f}%"
+            lines.append(f"#{job.id:<3} {job.state:<15} {job.content_type:<6} p{job.priority:<3} "
+                         f"{job.label:<16} {job.url} {detail}")
+        lines.append("—" * 60)
+        print("\n".join(lines))
+
+def create_job_queue(config):
+    settings = config.get('queue', {})
+    return JobQueue(
+        config,
+        path=os.path.expanduser(settings.get("path", JOBS_FILE)),
+        max_parallel=settings.get("max_parallel", 2),
+        rate_limit=parse_size(settings.get("rate_limit")),
+    )
@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import time
+from jobs import ACTIVE_STATES, CANCELLED, FAILED, FETCHING, QUEUED
+
+STORE_FILE = os.path.expanduser("~/.config/YtDownloader/shared-jobs.sqlite")
+
+# Several workers, in one or more processes on one or more hosts, take
+# jobs from one store. A worker claims a job by taking a lease on it and
+# renews the lease with heartbeats while it works. A job whose lease runs
+# out, because its worker died or lost the storage, is claimed again by
+# the next worker. After max_attempts claims it is failed instead, so a
+# job that keeps killing its workers does not go round forever.
+#
+# Workers only use claim(), heartbeat(), set_state(), set_download_path(),
+# finish(), release() and pending_count(), so any object with those methods
+# can stand in for the SQLite store.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    force INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    download_path TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, priority DESC, id);
+"""
+
+ACTIVE_PLACEHOLDERS = ", ".join("?" * len(ACTIVE_STATES))
+
+class SQLiteJobStore:
+    """Job store in an SQLite file, which can be on shared storage.
+
+    Every call opens its own connection, so a store can be used from any
+    thread. Claims run in a BEGIN IMMEDIATE transaction, which takes the
+    database's write lock before reading, so two workers can never claim
+    the same job. The rollback journal is kept (not WAL), as WAL needs
+    shared memory that network file systems do not provide. Lease times
+    are wall-clock times, so hosts sharing a store need synchronized
+    clocks.
+    """
+
+    def __init__(self, path=STORE_FILE, lease=120, max_attempts=3, timeout=30):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+            # Stores created before download paths were kept with the job
+            columns = [row["name"] for row in connection.execute("PRAGMA table_info(jobs)")]
+            if "download_path" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN download_path TEXT")
+
+    def _connect(self):
+        # isolation_level=None leaves transactions to explicit BEGINs
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return _Connection(connection)
+
+    def add(self, url, content_type="Video", quality="best", priority=0, force=False):
+        """Queues a download, or returns the id of the unfinished job that
+        already downloads url as content_type. Returns (id, added)."""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                f"SELECT id FROM jobs WHERE url = ? AND content_type = ? "
+                f"AND state IN (?, {ACTIVE_PLACEHOLDERS})",
+                (url, content_type, QUEUED, *ACTIVE_STATES)
+            ).fetchone()
+            if row is not None:
+                connection.execute("COMMIT")
+                return row["id"], False
+            cursor = connection.execute(
+                "INSERT INTO jobs (url, content_type, quality, priority, force, state, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, content_type, quality, priority, int(force), QUEUED, now, now)
+            )
+            connection.execute("COMMIT")
+            return cursor.lastrowid, True
+
+    def claim(self, worker):
+        """Leases the next job to worker: the highest priority queued job,
+        or a running job whose lease has expired. Returns the job as a dict
+        or None if there is nothing to do."""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            while True:
+                row = connection.execute(
+                    f"SELECT * FROM jobs WHERE state = ? "
+                    f"OR (state IN ({ACTIVE_PLACEHOLDERS}) AND lease_expires < ?) "
+                    f"ORDER BY priority DESC, id LIMIT 1",
+                    (QUEUED, *ACTIVE_STATES, now)
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    connection.execute(
+                        "UPDATE jobs SET state = ?, error = ?, worker = NULL, lease_expires = NULL, "
+                        "updated = ? WHERE id = ?",
+                        (FAILED, f"abandoned by {row['attempts']} workers", now, row["id"])
+                    )
+                    continue
+                connection.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "error = NULL, updated = ? WHERE id = ?",
+                    (FETCHING, worker, now + self.lease, now, row["id"])
+                )
+                connection.execute("COMMIT")
+                return dict(row, state=FETCHING, worker=worker, attempts=row["attempts"] + 1)
+
+    def _update_own(self, job_id, worker, assignments, values):
+        # Only the worker holding the lease may change a running job
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f"UPDATE jobs SET {assignments}, updated = ? "
+                f"WHERE id = ? AND worker = ? AND state IN ({ACTIVE_PLACEHOLDERS})",
+                (*values, time.time(), job_id, worker, *ACTIVE_STATES)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id, worker):
+        """Extends worker's lease on a job. False if the lease was lost to
+        another worker in the meantime."""
+        return self._update_own(job_id, worker, "lease_expires = ?", (time.time() + self.lease,))
+
+    def set_download_path(self, job_id, worker, download_path):
+        """Keeps the directory a job downloads to, so a worker taking it
+        over continues the part files there."""
+        return self._update_own(job_id, worker, "download_path = ?", (download_path,))
+
+    def set_state(self, job_id, worker, state):
+        return self._update_own(job_id, worker, "state = ?", (state,))
+
+    def finish(self, job_id, worker, state, error=None):
+        return self._update_own(
+            job_id, worker, "state = ?, error = ?, worker = NULL, lease_expires = NULL", (state, error)
+        )
+
+    def release(self, job_id, worker):
+        """Puts a job a worker gives up on back in the queue, so another
+        worker takes it without waiting for the lease to run out."""
+        return self._update_own(job_id, worker, "state = ?, worker = NULL, lease_expires = NULL", (QUEUED,))
+
+    def cancel(self, job_id):
+        """Cancels a job that no worker has claimed yet. False otherwise."""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, updated = ? WHERE id = ? AND state = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            return cursor.rowcount == 1
+
+    def pending_count(self):
+        """Jobs that are queued or still being worked on."""
+        with self._connect() as connection:
+            return connection.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE state IN (?, {ACTIVE_PLACEHOLDERS})",
+                (QUEUED, *ACTIVE_STATES)
+            ).fetchone()[0]
+
+    def jobs(self):
+        with self._connect() as connection:
+            return [dict(row) for row in connection.execute("SELECT * FROM jobs ORDER BY id")]
+
+class _Connection:
+    # sqlite3's own context manager commits but does not close
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None and self.connection.in_transaction:
+            self.connection.execute("ROLLBACK")
+        self.connection.close()
+
+def open_job_store(settings):
+    settings = settings or {}
+    return SQLiteJobStore(
+        path=os.path.expanduser(settings.get("store", STORE_FILE)),
+        lease=settings.get("lease", 120),
+        max_attempts=settings.get("max_attempts", 3),
+    )
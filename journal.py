@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from jsonfile import load_json, save_json
+from log import print_warning
+
+JOURNAL_FILE = os.path.expanduser("~/.config/YtDownloader/journal.json")
+
+class DownloadJournal:
+    """Record of downloads in flight, kept until they finish.
+
+    An entry is written before yt-dlp starts and removed once the file is
+    finished (or the download failed for good), so after a crash or Ctrl-C
+    the journal still holds the URL, the chosen format and the output
+    template. Running the same download again lets yt-dlp continue the
+    .part files, without fetching the video information first. Part files
+    are recorded as progress reports them.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        for entry in load_json(self.path, "download journal").get("entries", []):
+            self._entries[entry_key(entry['url'], entry['content_type'])] = entry
+
+    def _save(self):
+        # Synced to disk, as the journal is what is left after a crash
+        save_json(self.path, {"entries": list(self._entries.values())}, "download journal",
+                  indent=4, durable=True)
+
+    def begin(self, url, content_type, selected_format, download_path, filename_template):
+        if not self.enabled:
+            return None
+        key = entry_key(url, content_type)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._entries[key] = {
+                "url": url,
+                "content_type": content_type,
+                "selected_format": selected_format,
+                "download_path": download_path,
+                "filename_template": filename_template,
+                "part_files": [],
+                "started": time.time(),
+            }
+            self._save()
+        return key
+
+    def note_progress(self, key, event):
+        # Only the first event of each stream names a new part file
+        part_file = event.get('tmpfilename')
+        if key is None or not part_file:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and part_file not in entry['part_files']:
+                entry['part_files'].append(part_file)
+                self._save()
+
+    def end(self, key):
+        if key is None:
+            return
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def discard(self, entry):
+        """Forgets an interrupted download and removes its part files."""
+        discard_partial(entry)
+        self.end(entry_key(entry['url'], entry['content_type']))
+
+    def pending(self):
+        if not self.enabled:
+            return []
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return sorted(self._entries.values(), key=lambda entry: entry['started'])
+
+def entry_key(url, content_type):
+    return f"{content_type.lower()} {url}"
+
+def partial_size(entry):
+    """Bytes already on disk in the entry's part files."""
+    size = 0
+    for path in entry['part_files']:
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+def discard_partial(entry):
+    for path in entry['part_files']:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print_warning(f"Cannot remove {path}: {e}")
+
+_journal = DownloadJournal(enabled=False)
+
+def configure_journal(settings):
+    global _journal
+    settings = settings or {}
+    _journal = DownloadJournal(
+        path=os.path.expanduser(settings.get("path", JOURNAL_FILE)),
+        enabled=settings.get("enabled", True),
+    )
+    return _journal
+
+def get_journal():
+    return _journal
@@ -0,0 +1,40 @@
+import json
+import os
+from log import print_error, print_warning
+
+# The state files next to config.json (cache, job queue, journal, ...) are
+# small JSON objects that are read once and rewritten whole.
+
+def load_json(path, what):
+    """Returns the JSON object in path, or {} if there is none or it cannot
+    be read. what names the file in the warning, e.g. "job queue"."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print_warning(f"Ignoring unreadable {what} {path}: {e}")
+        return {}
+    if not isinstance(data, dict):
+        print_warning(f"Ignoring unreadable {what} {path}: not a JSON object")
+        return {}
+    return data
+
+def save_json(path, data, what, indent=None, durable=False):
+    """Writes data to a temporary file and moves it over path, so a crash
+    mid-write never leaves a truncated file. With durable, the data is on
+    disk before the old file is replaced. Returns False if it failed."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=indent)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print_error(f"Failed to save {what} {path}: {e}")
+        return False
+    return True
@@ -2,57 +2,299 @@ import sys
 import time
 import threading
 import os
+import shutil
+from formats import format_size
+from textwidth import fit, pad
 
-stop_event = threading.Event()
-loading_thread = None
+# The dashboard shows one line per running job (a lookup spinner, or the
+# stage, percent, speed and ETA of a download), redrawn from the task store
+# at a fixed frame rate. Every frame is a single write that first erases the
+# previous frame, so nothing flickers however many jobs report progress.
+# When stdout is not a terminal, stage changes are logged as plain lines.
+
+FRAME_RATE = 10
+SPINNER_CHARS = ['    ', '.   ', '..  ', '... ', '....']
+SPINNER_INTERVAL = 0.3
+# Stage, percent, size, speed and ETA; the label gets the rest of the line
+STATUS_WIDTH = 62
 
 def hide_cursor():
-    if os.name == 'nt':  
+    if os.name == 'nt':
         os.system('echo off')
-    else:  
+    else:
         sys.stdout.write("\033[?25l")
         sys.stdout.flush()
 
 def show_cursor():
     if os.name == 'nt':
         os.system('echo on')
-    else:  
+    else:
         sys.stdout.write("\033[?25h")
         sys.stdout.flush()
 
-def loading():
-    spinner_chars = ['    ', '.   ', '..  ', '... ', '....']
-    i = 0
-    message = "Fetching information"
-    
-    
-    hide_cursor()
-    
-    try:
-        while not stop_event.is_set():
-            sys.stdout.write(f"\r{message} {spinner_chars[i]}")
-            sys.stdout.flush()
-            time.sleep(0.3)
-            i = (i + 1) % len(spinner_chars)
-        
-        sys.stdout.write('\r' + ' ' * (len(message) + 5) + '\r')
-        sys.stdout.flush()
+def _duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+class Task:
+    """One dashboard line. Calling it with a progress event (see
+    engine.progress_event) updates it, so a task can be passed as the
+    progress callback of download.start_download."""
+
+    def __init__(self, dashboard, label, stage="", spinner=False):
+        self.dashboard = dashboard
+        self.label = label
+        self.stage = stage
+        self.spinner = spinner
+        self.started = time.monotonic()
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.speed = None
+        self.eta = None
+        self.done = False
+        self._padded = None
+
+    def __call__(self, event):
+        self.update(event)
+
+    def update(self, event):
+        if event['stage'] == "postprocess":
+            if event.get('status') == "started":
+                self.set_stage("post-processing")
+            return
+        if event['stage'] != "download":
+            return
+        self.downloaded_bytes = event.get('downloaded_bytes') or self.downloaded_bytes
+        self.total_bytes = event.get('total_bytes') or event.get('total_bytes_estimate') or self.total_bytes
+        self.speed = event.get('speed')
+        self.eta = event.get('eta')
+        self.set_stage("downloading")
+
+    def set_stage(self, stage):
+        if stage != self.stage:
+            self.stage = stage
+            self.dashboard.log(self, stage)
+
+    def set_label(self, label):
+        self.label = label
+
+    def finish(self, message=None):
+        self.dashboard.remove(self, message)
+
+    def render(self, width):
+        if self.spinner:
+            index = int((time.monotonic() - self.started) / SPINNER_INTERVAL) % len(SPINNER_CHARS)
+            return fit(f"{self.label} {SPINNER_CHARS[index]}", width, "")[0]
+
+        status = f"{self.stage:<15}"
+        if self.stage == "downloading" and self.total_bytes:
+            percent = min(self.downloaded_bytes * 100 / self.total_bytes, 100)
+            status += f" {percent:5.1f}% of {format_size(self.total_bytes):>9}"
+            if self.speed:
+                status += f" {format_size(self.speed):>8}/s"
+            if self.eta is not None:
+                status += f" ETA {_duration(self.eta)}"
+        elif self.stage == "downloading" and self.downloaded_bytes:
+            status += f" {format_size(self.downloaded_bytes):>9}"
+        else:
+            status += f" {_duration(time.monotonic() - self.started)}"
+
+        # Cut by columns, not characters: a line wider than the terminal
+        # wraps and the next frame would not erase all of it. The label
+        # rarely changes, so it is only measured again when it does.
+        label_width = max(width - STATUS_WIDTH - 1, 10)
+        if self._padded is None or self._padded[:2] != (self.label, label_width):
+            self._padded = (self.label, label_width, pad(self.label, label_width))
+        line = f"{self._padded[2]} {status}"
+        if label_width + 1 + len(status) > width:
+            line = fit(line, width, "")[0]
+        return line.rstrip()
+
+class _Passthrough:
+    """Stands in for sys.stdout/sys.stderr while the dashboard is drawn, so
+    whatever else is printed appears above it instead of through it.
+    Output is passed on a whole line at a time."""
+
+    def __init__(self, dashboard, stream):
+        self._dashboard = dashboard
+        self._stream = stream
+        self._pending = ""
+
+    def write(self, text):
+        self._pending += text
+        lines, newline, self._pending = self._pending.rpartition("\n")
+        if newline:
+            self._dashboard._write_above(self._stream, lines + newline)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self._pending:
+            self._stream.write(self._pending)
+            self._pending = ""
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+class Dashboard:
+    """Live view of the tasks in its store.
+
+    start() and stop() nest: drawing begins with the first start() and ends
+    with the matching last stop(). Tasks can be added at any time; they are
+    only shown while the dashboard is running.
+    """
+
+    def __init__(self, frame_rate=FRAME_RATE):
+        self.frame_rate = frame_rate
+        self._tasks = []
+        self._lock = threading.RLock()
+        # Serializes start() and stop(); the render thread only takes _lock
+        self._switch_lock = threading.Lock()
+        self._users = 0
+        self._interactive = False
+        self._out = None
+        self._saved_streams = None
+        self._drawn = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add(self, label, stage="", spinner=False):
+        task = Task(self, label, stage, spinner)
+        with self._lock:
+            self._tasks.append(task)
+        self.log(task, stage)
+        return task
+
+    def remove(self, task, message=None):
+        with self._lock:
+            if task.done:
+                return
+            task.done = True
+            self._tasks.remove(task)
+        if message:
+            self.log(task, message)
+
+    def log(self, task, stage):
+        # Plain output for pipes and files: one line per stage change
+        if not self._users or self._interactive or not stage:
+            return
+        line = f"{task.label}..." if task.spinner else f"[{stage}] {task.label}"
+        with self._lock:
+            self._out.write(line + "\n")
+            self._out.flush()
+
+    def start(self):
+        with self._switch_lock:
+            with self._lock:
+                self._users += 1
+                if self._users > 1:
+                    return
+                self._out = sys.stdout
+                self._interactive = self._out.isatty() and os.environ.get("TERM") != "dumb"
+                if not self._interactive:
+                    return
+                hide_cursor()
+                self._saved_streams = (sys.stdout, sys.stderr)
+                sys.stdout = _Passthrough(self, sys.stdout)
+                sys.stderr = _Passthrough(self, sys.stderr)
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._render_loop, name="dashboard", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        # The switch lock stays held while the render thread finishes, so a
+        # start() in the meantime waits instead of wrapping the streams this
+        # stop() is about to restore
+        with self._switch_lock:
+            with self._lock:
+                if not self._users:
+                    return
+                self._users -= 1
+                if self._users or not self._interactive:
+                    return
+                thread = self._thread
+                self._thread = None
+            self._stop_event.set()
+            thread.join()
+
+            with self._lock:
+                self._erase()
+                for stream in (sys.stdout, sys.stderr):
+                    if isinstance(stream, _Passthrough):
+                        stream.drain()
+                sys.stdout, sys.stderr = self._saved_streams
+                self._saved_streams = None
+                self._out.flush()
+            show_cursor()
+
+    def _render_loop(self):
+        interval = 1 / self.frame_rate
+        while not self._stop_event.wait(interval):
+            self.render()
+
+    def _erase_sequence(self):
+        # Moves to the first line of the previous frame and clears below it
+        return f"\033[{self._drawn}F\033[J" if self._drawn else ""
+
+    def _erase(self):
+        # Called with self._lock held
+        if self._drawn:
+            self._out.write(self._erase_sequence())
+            self._drawn = 0
+
+    def _write_above(self, stream, text):
+        with self._lock:
+            self._erase()
+            self._out.flush()
+            stream.write(text)
+            stream.flush()
+        # Redraw right away rather than leaving a gap until the next frame
+        self.render()
+
+    def render(self):
+        width = shutil.get_terminal_size().columns - 1
+        with self._lock:
+            if not self._users or not self._interactive:
+                return
+            lines = [task.render(width) for task in self._tasks]
+            frame = self._erase_sequence() + "".join(line + "\033[K\n" for line in lines)
+            self._drawn = len(lines)
+            if frame:
+                self._out.write(frame)
+                self._out.flush()
+
+_dashboard = Dashboard()
+
+def get_dashboard():
+    return _dashboard
+
+# Spinners started by each thread, so nested and concurrent
+# start_loading/stop_loading pairs each stop their own
+_local = threading.local()
+
+def start_loading(message="Fetching information"):
+    dashboard = get_dashboard()
+    task = dashboard.add(message, spinner=True)
+    if not hasattr(_local, "tasks"):
+        _local.tasks = []
+    _local.tasks.append(task)
+    dashboard.start()
+    return task
 
-    finally: 
-        show_cursor()
-
-def start_loading():
-    global loading_thread
-    if loading_thread is None or not loading_thread.is_alive():  
-        stop_event.clear()
-        loading_thread = threading.Thread(target=loading)
-        loading_thread.daemon = True
-        loading_thread.start()
-
-def stop_loading():
-    global loading_thread
-    if loading_thread and loading_thread.is_alive():
-        stop_event.set()  
-        loading_thread.join()
-        loading_thread = None
-    show_cursor()
+def stop_loading(task=None):
+    tasks = getattr(_local, "tasks", [])
+    if task is None:
+        if not tasks:
+            return
+        task = tasks.pop()
+    elif task in tasks:
+        tasks.remove(task)
+    else:
+        return
+    task.finish()
+    get_dashboard().stop()
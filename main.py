@@ -1,45 +1,429 @@
 #!/usr/bin/env python3
 
+import importlib
 import os
-from log import print_error, print_red, show_logo
-from download import download_video, download_audio
-import re
+import threading
+from log import print_cyan, print_error, print_red, print_success, print_warning, show_logo
+from loading import start_loading, stop_loading
+from prefetch import Prefetcher
+from jobs import create_job_queue
+from server import DEFAULT_PORT, serve_main
 import sys
 import shutil
+import argparse
 from config import load_config, ensure_download_path_exists
+from cache import configure_cache, get_cache
+from archive import configure_archive, get_archive, is_archived
+from engine import configure_engine
+from retry import configure_retry
+from metrics import configure_metrics
+from journal import configure_journal, get_journal, partial_size
+from storage import configure_storage
+from postprocess import configure_postprocess, ffmpeg_available
+from formats import AUDIO_TARGETS, is_valid_quality
+from probe import get_probe
+from urls import is_collection_url, is_valid_youtube_url
+
+# The download stack (download, batch and yt_dlp itself) is imported by
+# the code paths that use it rather than here, so the menu, --help and the
+# queue commands come up without loading it
+
+VERSION = "1.1.1" # version
 
 def clear_screen():
-    os.system("clear")
+    # What `clear` prints, without starting a process for it; output that
+    # is not a terminal is left alone
+    if sys.stdout.isatty():
+        sys.stdout.write("\033[H\033[2J\033[3J")
+        sys.stdout.flush()
 
-def is_valid_youtube_url(url):
-    if not url:
-        return False
-    pattern = re.compile(
-        r"^(https?://)?(www\.)?"
-        r"(youtube\.com/(watch\?v=|embed/|v/|shorts/"
-        r"|playlist\?list=|user/|c/|channel/)|youtu\.be/)"
-        r"[A-Za-z0-9_-]+"
-        r"([?&][A-Za-z0-9_=-]+)*$"
-    )
+def print_version(engine):
+    print(f"Version: {VERSION}")
+    found = get_probe().yt_dlp(engine.name)
+    if found:
+        print(f"yt-dlp: {found['version'] or 'unknown version'} ({found['path']})")
+
+def preload(engine):
+    # Runs while the user reads the menu, so the first URL does not wait
+    # for these imports
+    importlib.import_module("download")
+    if engine.name == "yt_dlp":
+        engine.load()
+
+# Several URLs can be pasted at once; a trailing "-r" forces a metadata
+# refresh (and a new download) instead of using the cache and archive
+def parse_url_input(text):
+    parts = text.split()
+    refresh = len(parts) > 1 and parts[-1] == "-r"
+    if refresh:
+        parts = parts[:-1]
+    return parts, refresh
+
+def wait_for_info(future):
+    if not future.done():
+        start_loading()
+        try:
+            future.result()
+        except Exception:
+            pass
+        finally:
+            stop_loading()
+    try:
+        return future.result()
+    except Exception as e:
+        print_error(e)
+        return None
+
+def prompt_urls(is_audio, config, prefetcher, jobs):
+    from batch import download_collection
+    from download import choose_format
+
+    kind = "audio" if is_audio else "video"
+    content_type = "Audio" if is_audio else "Video"
+    target_codec = config['audio'].get("target_codec", "") if is_audio else ""
+    message = f" Enter {kind} url(s), j for jobs or 0 to cancel "
+
+    while True:
+        print("╭" + "─" * len(message) + "╮")
+        print("│" + message + "│")
+        print("╰" + "─" * len(message) + "╯")
+        urls, refresh = parse_url_input(str(input("Enter The Url: ")))
+        if urls == ["0"]:
+            clear_screen()
+            show_logo()
+            return
+        if urls == ["j"]:
+            jobs.print_jobs()
+            continue
+
+        # Start every lookup before showing the first format table
+        for url in urls:
+            if is_collection_url(url):
+                download_collection(url, config, is_audio=is_audio)
+            elif not is_valid_youtube_url(url):
+                print_error(f"'{url}' Is not a valid youtube url")
+            elif not refresh and is_archived(url, content_type):
+                print_warning(f"{url} already downloaded, skipping (add -r after the URL to download it again)")
+            else:
+                prefetcher.submit(url, refresh)
+
+        while len(prefetcher):
+            url, future = prefetcher.next_ready()
+            selected_format = choose_format(wait_for_info(future), is_audio=is_audio, target_codec=target_codec)
+            if selected_format is not None:
+                jobs.submit(url, content_type, selected_format=selected_format, force=refresh)
+
+def resume_interrupted(config, ask=True):
+    """Offers to finish downloads the journal has from an earlier run that
+    crashed or was cancelled. Returns False if one of them failed."""
+    from download import download_content, format_filesize
+
+    journal = get_journal()
+    entries = journal.pending()
+    if not entries:
+        return True
+
+    print_cyan(f"{len(entries)} download(s) were interrupted in an earlier session:")
+    for entry in entries:
+        size = partial_size(entry)
+        partial = f", {format_filesize(size)} downloaded" if size else ""
+        print(f"  {entry['content_type']:<6} {entry['url']} "
+              f"(format {entry['selected_format']['format_id']}{partial})")
+    if ask:
+        answer = input("Resume them now? [Y/n, d to discard] ").strip().lower()
+        if answer == "d":
+            for entry in entries:
+                journal.discard(entry)
+            print_warning("Discarded the interrupted downloads")
+            return True
+        if answer not in ("", "y", "yes"):
+            # Kept in the journal for next time
+            return True
+
+    # Same format and output file as before, so yt-dlp continues the
+    # part files instead of starting over
+    ok = True
+    for entry in entries:
+        content_type = entry['content_type']
+        section = dict(
+            config[content_type.lower()],
+            download_path=entry['download_path'],
+            filename_template=entry['filename_template'],
+        )
+        print_cyan(f"Resuming {entry['url']}")
+        ok = download_content(entry['url'], entry['selected_format'], content_type, section) and ok
+    return ok
+
+def abort_downloads():
+    # Partial downloads are resumed by yt-dlp's -c on the next run. The
+    # download threads cannot be interrupted, so the process exits without
+    # joining them, and without the atexit handlers: the cache is saved here.
+    print_red("Aborting active downloads...")
+    get_cache().save()
+    os._exit(130)
+
+def finish_jobs(jobs):
+    try:
+        jobs.wait()
+    except KeyboardInterrupt:
+        abort_downloads()
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download videos and audio from YouTube.")
+    parser.add_argument("--version", action="store_true", help="show the program and yt-dlp versions and exit")
+    subparsers = parser.add_subparsers(dest="command")
+
+    get = subparsers.add_parser("get", help="download the given URLs without prompts and exit")
+    get.add_argument("urls", nargs="+")
+    get.add_argument("--audio", action="store_true", help="download audio instead of video")
+    get.add_argument("--quality",
+                     help="best, worst, the maximum height/bitrate or a quality policy "
+                          "(default: from config)")
+
+    batch = subparsers.add_parser("batch", help="download a list of URLs without prompts")
+    batch.add_argument("source", help="file with one URL per line, or - to read stdin")
+    batch.add_argument("--audio", action="store_true", help="download audio instead of video")
+    batch.add_argument("--quality",
+                       help="best, worst, the maximum height/bitrate (e.g. 720 or 128) or a quality "
+                            "policy such as max_height=1080,codecs=av01>vp9>avc1 (default: from config)")
+    batch.add_argument("--fetch-workers", type=positive_int, default=4,
+                       help="concurrent metadata fetches (default: 4)")
+    batch.add_argument("--download-workers", type=positive_int, default=2,
+                       help="concurrent downloads (default: 2)")
+
+    archive = subparsers.add_parser("import-archive",
+                                    help="import a yt-dlp --download-archive file")
+    archive.add_argument("file", help="archive file written by yt-dlp --download-archive")
+    archive.add_argument("--audio", action="store_true",
+                         help="record the entries as downloaded audio instead of video")
+
+    queue = subparsers.add_parser("queue", help="manage the persistent download queue")
+    queue_commands = queue.add_subparsers(dest="queue_command", required=True)
+    queue_add = queue_commands.add_parser("add", help="queue URLs for download")
+    queue_add.add_argument("urls", nargs="+")
+    queue_add.add_argument("--audio", action="store_true", help="download audio instead of video")
+    queue_add.add_argument("--quality",
+                           help="best, worst, the maximum height/bitrate or a quality policy "
+                                "(default: from config)")
+    queue_add.add_argument("--priority", type=int, default=0,
+                           help="higher priorities start first (default: 0)")
+    queue_list = queue_commands.add_parser("list", help="show queued and finished downloads")
+    queue_commands.add_parser("run", help="download everything in the queue, then exit")
+    queue_cancel = queue_commands.add_parser("cancel", help="cancel queued downloads")
+    queue_cancel.add_argument("ids", nargs="+", type=int)
+    for command in (queue_add, queue_list, queue_cancel):
+        command.add_argument("--shared", action="store_true",
+                             help="use the shared job store of the workers instead of this machine's queue")
+
+    subscribe = subparsers.add_parser("subscribe", help="manage the channels and playlists kept in sync")
+    subscribe_commands = subscribe.add_subparsers(dest="subscribe_command", required=True)
+    subscribe_add = subscribe_commands.add_parser("add", help="subscribe to channels or playlists")
+    subscribe_add.add_argument("urls", nargs="+")
+    subscribe_add.add_argument("--audio", action="store_true", help="download audio instead of video")
+    subscribe_add.add_argument("--quality",
+                               help="best, worst, the maximum height/bitrate or a quality policy "
+                                    "(default: from config)")
+    subscribe_add.add_argument("--new-only", action="store_true",
+                               help="only download videos uploaded after the first sync")
+    subscribe_commands.add_parser("list", help="show subscriptions and their last sync")
+    subscribe_remove = subscribe_commands.add_parser("remove", help="unsubscribe")
+    subscribe_remove.add_argument("urls", nargs="+")
+
+    sync = subparsers.add_parser("sync", help="queue and download the new videos of every subscription")
+    sync.add_argument("--no-download", action="store_true",
+                      help="only queue the new videos, for a later queue run")
+    sync.add_argument("--shared", action="store_true",
+                      help="queue them in the shared job store of the workers")
+    sync.add_argument("--workers", type=positive_int,
+                      help="subscriptions listed at a time (default: from config)")
+
+    worker = subparsers.add_parser("worker", help="download jobs from the shared job store")
+    worker.add_argument("--concurrency", type=positive_int,
+                        help="jobs downloaded at a time (default: from config)")
+    worker.add_argument("--drain", action="store_true",
+                        help="exit once no jobs are queued or running")
+
+    serve = subparsers.add_parser("serve", help="run a local HTTP/JSON API for submitting downloads")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT,
+                       help=f"port to listen on (default: {DEFAULT_PORT})")
 
-    return re.match(pattern, url) is not None
+    resume = subparsers.add_parser("resume", help="finish downloads interrupted by a crash or Ctrl-C")
+    resume.add_argument("--discard", action="store_true",
+                        help="forget them and delete their partial files instead")
+
+    return parser.parse_args(argv)
+
+def queue_main(args, jobs):
+    if args.queue_command == "add":
+        content_type = "Audio" if args.audio else "Video"
+        quality = args.quality or jobs.config[content_type.lower()].get("quality", "best")
+        if not is_valid_quality(quality):
+            print_error(f"Invalid quality '{quality}': use best, worst, a number or a quality policy")
+            return False
+        ok = True
+        for url in args.urls:
+            if is_valid_youtube_url(url) and not is_collection_url(url):
+                jobs.submit(url, content_type, quality=quality, priority=args.priority)
+            else:
+                print_error(f"'{url}' Is not a valid youtube video url")
+                ok = False
+        return ok
+
+    if args.queue_command == "list":
+        jobs.print_jobs()
+        return True
+
+    if args.queue_command == "cancel":
+        ok = True
+        for job_id in args.ids:
+            if not jobs.cancel(job_id):
+                print_error(f"Download #{job_id} is not queued")
+                ok = False
+        return ok
+
+    finish_jobs(jobs)
+    jobs.print_jobs()
+    return True
+
+def run_sync(args, config, submit):
+    from subscriptions import sync_main
+    try:
+        return sync_main(args, config, submit)
+    except KeyboardInterrupt:
+        print_red("Sync interrupted, the subscriptions listed so far are saved")
+        get_cache().save()
+        os._exit(130)
+
+def import_archive(args):
+    content_type = "Audio" if args.audio else "Video"
+    try:
+        added = get_archive().import_yt_dlp_archive(args.file, content_type)
+    except OSError as e:
+        print_error(f"Cannot read {args.file}: {e}")
+        return False
+    print_success(f"Imported {added} {content_type.lower()} entries from {args.file}")
+    return True
 
 def main():
-    yt_dlp = shutil.which("yt-dlp")
-    if yt_dlp:
-        pass
-    else:
+    args = parse_args()
+    config = load_config()
+    try:
+        engine = configure_engine(config.get('engine'))
+    except ImportError:
+        print_error("yt_dlp module not found, install it first with: pip install yt-dlp")
+        sys.exit(127)
+
+    if engine.name == "subprocess" and not shutil.which("yt-dlp"):
         print_error("yt-dlp not found, install it firts with: pip install yt-dlp")
         sys.exit(127)
-    
-    config = load_config()
+    if args.version:
+        print_version(engine)
+        sys.exit(0)
+
     if not ensure_download_path_exists(config):
         print_error("Download path does not exist or could not be created. Exiting.")
         sys.exit(1)
+    configure_metrics(config.get('metrics'))
+    configure_cache(config.get('cache'))
+    configure_archive(config.get('archive'))
+    configure_retry(config.get('retry'))
+    configure_postprocess(config.get('postprocess'))
+    configure_journal(config.get('journal'))
+    try:
+        configure_storage(config.get('storage'))
+    except ValueError as e:
+        print_error(f"Invalid storage setting: {e}")
+        sys.exit(1)
+
+    target_codec = config['audio'].get("target_codec", "")
+    if target_codec and target_codec not in AUDIO_TARGETS:
+        print_error(f"Invalid audio target_codec '{target_codec}': use one of {', '.join(AUDIO_TARGETS)}")
+        sys.exit(1)
+    if not ffmpeg_available():
+        if target_codec:
+            print_warning(f"ffmpeg not found, audio will be kept as downloaded instead of converted to {target_codec}")
+        if any(config[kind].get("embed_thumbnail") or config[kind].get("embed_metadata") for kind in ("video", "audio")):
+            print_warning("ffmpeg not found, thumbnails and metadata will not be embedded")
+
+    if args.command in ("batch", "get"):
+        from batch import batch_main, get_main
+        run = batch_main if args.command == "batch" else get_main
+        try:
+            ok = run(args, config)
+        except KeyboardInterrupt:
+            abort_downloads()
+        sys.exit(0 if ok else 1)
+    if args.command == "import-archive":
+        sys.exit(0 if import_archive(args) else 1)
+    if args.command == "resume":
+        if args.discard:
+            for entry in get_journal().pending():
+                get_journal().discard(entry)
+            sys.exit(0)
+        sys.exit(0 if resume_interrupted(config, ask=False) else 1)
+    if args.command == "worker" or (args.command == "queue" and getattr(args, "shared", False)):
+        import sqlite3
+        from worker import shared_queue_main, worker_main
+        run = worker_main if args.command == "worker" else shared_queue_main
+        try:
+            sys.exit(0 if run(args, config) else 1)
+        except sqlite3.Error as e:
+            print_error(f"Cannot use the shared job store: {e}")
+            sys.exit(1)
+
+    if args.command == "subscribe":
+        from subscriptions import subscribe_main
+        sys.exit(0 if subscribe_main(args, config) else 1)
+    if args.command == "sync" and args.shared:
+        from jobstore import open_job_store
+        store = open_job_store(config.get('worker'))
+        sys.exit(0 if run_sync(args, config, lambda urls, content_type, quality:
+                                [store.add(url, content_type, quality) for url in urls]) else 1)
+
+    try:
+        jobs = create_job_queue(config)
+    except ValueError as e:
+        print_error(f"Invalid queue setting: {e}")
+        sys.exit(1)
+
+    if args.command == "queue":
+        sys.exit(0 if queue_main(args, jobs) else 1)
+    if args.command == "serve":
+        sys.exit(0 if serve_main(args, jobs) else 1)
+    if args.command == "sync":
+        # Downloads start while later subscriptions are still being listed
+        if not args.no_download:
+            jobs.start()
+        ok = run_sync(args, config, lambda urls, content_type, quality:
+                      jobs.submit_many(urls, content_type, quality=quality))
+        if not args.no_download:
+            finish_jobs(jobs)
+        sys.exit(0 if ok else 1)
+
+    prefetcher = Prefetcher(config.get('interactive', {}).get('prefetch_workers', 3))
+    pending = jobs.pending_count()
+    jobs.start()
 
     clear_screen()
     show_logo()
-    print("Version: 1.1.1") # version
+    print_version(engine)
+    if pending:
+        print_cyan(f"Resuming {pending} queued download(s) from the last session")
+    try:
+        resume_interrupted(config, ask=not config.get('journal', {}).get("auto_resume", False))
+    except KeyboardInterrupt:
+        print_red("Exiting...")
+        finish_jobs(jobs)
+        sys.exit(0)
+    threading.Thread(target=preload, args=(engine,), name="preload", daemon=True).start()
     while True:
         print("╭" + "─" * 30 + "╮")
         print("│ 1. Video                     │")
@@ -49,42 +433,14 @@ def main():
         try:
             user_input = int(input("Select download method: "))
 
-            if user_input == 1:
-                clear_screen()
-                show_logo()
-                while True:
-                    print("╭" + "─" * 34 + "╮")
-                    print("│ Enter video url or 0 to cancel   │")
-                    print("╰" + "─" * 34 + "╯")
-                    input_video_url = str(input("Enter The Url: ")).strip()
-                    if is_valid_youtube_url(input_video_url):
-                        download_video(input_video_url, config['video'])
-                    elif input_video_url == "0":
-                        clear_screen()
-                        show_logo()
-                        break
-                    else:
-                        print_error(f"'{input_video_url}' Is not a valid youtube url")
-
-            elif user_input == 2:
+            if user_input in (1, 2):
                 clear_screen()
                 show_logo()
-                while True:
-                    print("╭" + "─" * 34 + "╮")
-                    print("│ Enter audio url or 0 to cancel   │")
-                    print("╰" + "─" * 34 + "╯")
-                    input_audio_url = str(input("Enter The Url: ")).strip()
-                    if is_valid_youtube_url(input_audio_url):
-                        download_audio(input_audio_url, config['audio'])
-                    elif input_audio_url == "0":
-                        clear_screen()
-                        show_logo()
-                        break
-                    else:
-                        print_error(f"'{input_audio_url}' Is not a valid youtube url")
+                prompt_urls(user_input == 2, config, prefetcher, jobs)
                     
             elif user_input == 3:
                 print_red("Exiting...")
+                finish_jobs(jobs)
                 sys.exit(0)
             else:
                 print_error("Invalid option")
@@ -93,6 +449,8 @@ def main():
             print_error("Invalid Input")
         except KeyboardInterrupt:
             print_red("Exiting...")
+            prefetcher.shutdown()
+            finish_jobs(jobs)
             sys.exit(0)
 
 if __name__ == "__main__":
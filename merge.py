@@ -0,0 +1,125 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from engine import EngineError, get_engine
+from formats import format_size
+from postprocess import ffmpeg_available
+from retry import get_retry_policy
+
+# Merged formats ("137+140", see formats.pair_formats) are downloaded as two
+# separate streams at the same time; yt-dlp would fetch them one after the
+# other. The post-processing pass then muxes them with stream copy.
+
+STREAM_SUFFIX = ".f%(format_id)s.%(ext)s"
+
+def can_merge():
+    return ffmpeg_available()
+
+def stream_template(outtmpl):
+    # Same naming yt-dlp uses for the parts of a merged format
+    if outtmpl.endswith(".%(ext)s"):
+        outtmpl = outtmpl[:-len(".%(ext)s")]
+    return outtmpl + STREAM_SUFFIX
+
+def merged_path(video_path, format_id, ext):
+    root = os.path.splitext(video_path)[0]
+    suffix = f".f{format_id}"
+    if root.endswith(suffix):
+        root = root[:-len(suffix)]
+    return f"{root}.{ext}"
+
+class MergedProgress:
+    """Adds up progress of both streams into one download event.
+
+    Events go to callback when there is one, otherwise a single progress
+    line is printed unless quiet.
+    """
+
+    def __init__(self, callback=None, quiet=False):
+        self.callback = callback
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._printed = False
+
+    def stream(self, name):
+        return lambda event: self.update(name, event)
+
+    def update(self, name, event):
+        if event['stage'] != "download":
+            if self.callback:
+                self.callback(event)
+            return
+
+        with self._lock:
+            self._streams[name] = event
+            streams = list(self._streams.values())
+        combined = {
+            'stage': "download",
+            'status': "finished" if all(e.get('status') == "finished" for e in streams) else "downloading",
+            'downloaded_bytes': sum(e.get('downloaded_bytes') or 0 for e in streams),
+            'total_bytes': sum(e.get('total_bytes') or e.get('total_bytes_estimate') or 0 for e in streams),
+            'speed': sum(e.get('speed') or 0 for e in streams) or None,
+            'eta': max((e.get('eta') or 0 for e in streams), default=None),
+            # Part file of the stream that reported, for the journal
+            'tmpfilename': event.get('tmpfilename'),
+        }
+
+        if self.callback:
+            self.callback(combined)
+        elif not self.quiet and combined['total_bytes']:
+            percent = combined['downloaded_bytes'] * 100 / combined['total_bytes']
+            speed = f" at {format_size(combined['speed'])}/s" if combined['speed'] else ""
+            sys.stdout.write(f"\r[download] {percent:5.1f}% of {format_size(combined['total_bytes'])}{speed}   ")
+            sys.stdout.flush()
+            self._printed = True
+
+    def close(self):
+        if self._printed:
+            sys.stdout.write("\n")
+
+def download_merged(url, selected_format, options, progress=None):
+    """Downloads both streams of a merged format concurrently.
+
+    options are the engine download options for the merged file; only the
+    video stream writes the thumbnail. Returns the engine results of the
+    video and the audio stream.
+    """
+    video_format = selected_format['video_format']
+    audio_format = selected_format['audio_format']
+    tracker = MergedProgress(progress, options.get('quiet'))
+
+    # Split the bandwidth budget by stream size so both finish together;
+    # a share of 0 would mean no limit to yt-dlp
+    rate_limit = options.get('rate_limit')
+    video_share = 0.5
+    if video_format['filesize'] and audio_format['filesize']:
+        video_share = video_format['filesize'] / (video_format['filesize'] + audio_format['filesize'])
+
+    stream_options = dict(options, outtmpl=stream_template(options['outtmpl']), quiet=True)
+    video_options = dict(
+        stream_options,
+        format=video_format['format_id'],
+        rate_limit=max(1, int(rate_limit * video_share)) if rate_limit else None
+    )
+    audio_options = dict(
+        stream_options,
+        format=audio_format['format_id'],
+        write_thumbnail=False,
+        rate_limit=max(1, int(rate_limit * (1 - video_share))) if rate_limit else None
+    )
+
+    def fetch(stream_options, name):
+        return get_retry_policy().call(
+            lambda: get_engine().download(url, stream_options, progress=tracker.stream(name)),
+            url, EngineError, f"Download ({name})"
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            video_future = pool.submit(fetch, video_options, "video")
+            audio_future = pool.submit(fetch, audio_options, "audio")
+            return video_future.result(), audio_future.result()
+    finally:
+        tracker.close()
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from log import print_warning
+
+EVENTS_FILE = os.path.expanduser("~/.config/YtDownloader/events.jsonl")
+
+# Every event is one JSON line with at least 'ts', 'event' and 'worker' (the
+# thread that produced it):
+#   fetch        url, seconds, cached, ok
+#   download     url, content_type, format_id, ok, bytes, seconds,
+#                bytes_per_second, ttfb, fragment_retries
+#   postprocess  url, seconds, ok
+#   retry        url, kind, description (a retried lookup or download)
+
+class Metrics:
+    """Collects per-job events into a JSON-lines log and running totals
+    that serve() exposes in the Prometheus text format. emit() holds
+    self._lock while it calls _write(), _count() and _add()."""
+
+    def __init__(self, path=EVENTS_FILE, enabled=False):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._file = None
+        self._counters = {}
+        self._server = None
+
+    def emit(self, event, **fields):
+        if not self.enabled:
+            return
+        record = {'ts': round(time.time(), 3), 'event': event, 'worker': worker_name()}
+        record.update(fields)
+
+        with self._lock:
+            self._count(record)
+            if self.path:
+                self._write(record)
+
+    def _write(self, record):
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding="utf-8")
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+        except OSError as e:
+            print_warning(f"Cannot write metrics to {self.path}: {e}")
+            self.path = None
+
+    def _add(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _count(self, record):
+        event = record['event']
+        worker = {'worker': record['worker']}
+        if event == "fetch":
+            labels = {'cached': str(bool(record.get('cached'))).lower()}
+            self._add("ytd_fetch_seconds_sum", labels, record.get('seconds') or 0)
+            self._add("ytd_fetch_seconds_count", labels)
+            if not record.get('ok'):
+                self._add("ytd_fetch_failures_total", {})
+        elif event == "download":
+            self._add("ytd_downloads_total", dict(worker, result="ok" if record.get('ok') else "failed"))
+            self._add("ytd_download_bytes_total", worker, record.get('bytes') or 0)
+            self._add("ytd_download_seconds_total", worker, record.get('seconds') or 0)
+            self._add("ytd_fragment_retries_total", worker, record.get('fragment_retries') or 0)
+            if record.get('ttfb') is not None:
+                self._add("ytd_ttfb_seconds_sum", {}, record['ttfb'])
+                self._add("ytd_ttfb_seconds_count", {})
+        elif event == "postprocess":
+            self._add("ytd_postprocess_seconds_sum", {}, record.get('seconds') or 0)
+            self._add("ytd_postprocess_seconds_count", {})
+            if not record.get('ok'):
+                self._add("ytd_postprocess_failures_total", {})
+        elif event == "retry":
+            self._add("ytd_retries_total", {'kind': record.get('kind', "")})
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._counters.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in items:
+            if name.endswith(("_sum", "_count")):
+                family, kind = name.rsplit("_", 1)[0], "summary"
+            else:
+                family, kind = name, "counter"
+            if family not in typed:
+                typed.add(family)
+                lines.append(f"# TYPE {family} {kind}")
+            label_text = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves /metrics on localhost from a background thread."""
+        # Only imported when the endpoint is enabled, it is slow to import
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def worker_name():
+    return threading.current_thread().name
+
+class DownloadTimer:
+    """Progress callback wrapper that measures one download.
+
+    Time-to-first-byte is taken from the first progress event with data,
+    fragment retries from 'retry' events reported by the engine. Events are
+    passed on to callback unchanged.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.started = time.monotonic()
+        self.ttfb = None
+        self.bytes = 0
+        self.fragment_retries = 0
+
+    def __call__(self, event):
+        if event['stage'] == "retry":
+            self.fragment_retries += 1
+        elif event['stage'] == "download" and not event.get('joined'):
+            # Joined events are another caller's transfer
+            downloaded = event.get('downloaded_bytes') or 0
+            if self.ttfb is None and downloaded:
+                self.ttfb = time.monotonic() - self.started
+            # Merged formats report the sum of both streams
+            if event.get('status') == "finished":
+                self.bytes = max(self.bytes, event.get('total_bytes') or downloaded)
+            else:
+                self.bytes = max(self.bytes, downloaded)
+        if self.callback:
+            self.callback(event)
+
+    def fields(self):
+        seconds = time.monotonic() - self.started
+        return {
+            'bytes': self.bytes,
+            'seconds': round(seconds, 3),
+            'bytes_per_second': round(self.bytes / seconds) if seconds > 0 else None,
+            'ttfb': round(self.ttfb, 3) if self.ttfb is not None else None,
+            'fragment_retries': self.fragment_retries,
+        }
+
+_metrics = Metrics()
+
+def configure_metrics(settings):
+    global _metrics
+    settings = settings or {}
+    path = settings.get("log_path", EVENTS_FILE)
+    _metrics = Metrics(
+        path=os.path.expanduser(path) if path else None,
+        enabled=settings.get("enabled", False),
+    )
+    port = settings.get("prometheus_port", 0)
+    if _metrics.enabled and port:
+        try:
+            _metrics.serve(port)
+        except OSError as e:
+            print_warning(f"Cannot serve metrics on port {port}: {e}")
+    return _metrics
+
+def get_metrics():
+    return _metrics
@@ -0,0 +1,39 @@
+import json
+
+# Fields read by get_video_info_data, get_best_formats and the cache.
+# Everything else in yt-dlp's info dict (subtitles, heatmaps, thumbnails
+# lists, per-format http_headers, ...) is dropped right after parsing.
+INFO_FIELDS = (
+    "id", "extractor", "extractor_key", "_type", "_version",
+    "title", "channel", "uploader", "duration_string", "webpage_url",
+)
+FORMAT_FIELDS = (
+    "format_id", "ext", "protocol", "acodec", "vcodec", "abr", "asr",
+    "height", "resolution", "filesize", "filesize_approx",
+)
+ENTRY_FIELDS = ("_type", "ie_key", "id", "url", "webpage_url", "title", "upload_date", "timestamp")
+
+def slim_info(info):
+    slim = {key: info[key] for key in INFO_FIELDS if key in info}
+    formats = info.get("formats")
+    if formats is not None:
+        slim["formats"] = [
+            {key: fmt[key] for key in FORMAT_FIELDS if key in fmt}
+            for fmt in formats
+        ]
+    return slim
+
+def slim_entry(entry):
+    return {key: entry[key] for key in ENTRY_FIELDS if key in entry}
+
+def iter_json_lines(stream, slim=None):
+    """Yields one dict per line of yt-dlp's line-delimited JSON output.
+
+    Lines are parsed as they arrive, and slim (e.g. slim_info) is applied
+    before the next line is read so only the kept fields stay in memory.
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        yield slim(data) if slim else data
@@ -0,0 +1,58 @@
+import time
+from engine import get_engine
+from urls import extract_video_id
+
+# Channel home pages resolve to their tabs (videos, shorts, live), which are
+# playlists themselves
+MAX_NESTING = 2
+
+def entry_url(entry):
+    url = entry.get('url') or entry.get('webpage_url')
+    if entry.get('ie_key') == 'Youtube' and entry.get('id'):
+        return f"https://www.youtube.com/watch?v={entry['id']}"
+    return url
+
+def entry_upload_date(entry):
+    # Flat listings carry an upload date or a timestamp for some tabs only
+    if entry.get('upload_date'):
+        return entry['upload_date']
+    if entry.get('timestamp'):
+        return time.strftime("%Y%m%d", time.gmtime(entry['timestamp']))
+    return None
+
+def iter_playlist_entries(url, depth=0, is_known=None, stop_after=0):
+    """Yields {'id', 'url', 'title', 'upload_date'} for each video of a
+    playlist or channel.
+
+    Entries come from flat extraction, so nothing but the listing itself is
+    fetched here; formats are resolved later, one entry at a time. With
+    is_known and stop_after, a listing ends after stop_after entries in a
+    row for which is_known(entry) is true, and the pages after them are
+    never fetched. Each tab of a channel stops on its own.
+    """
+    entries = get_engine().iter_flat_entries(url)
+    streak = 0
+    try:
+        for entry in entries:
+            item_url = entry_url(entry)
+            if not item_url:
+                continue
+
+            video_id = extract_video_id(item_url)
+            if video_id:
+                item = {
+                    'id': video_id,
+                    'url': item_url,
+                    'title': entry.get('title'),
+                    'upload_date': entry_upload_date(entry),
+                }
+                yield item
+                if is_known is not None and stop_after:
+                    streak = streak + 1 if is_known(item) else 0
+                    if streak >= stop_after:
+                        return
+            elif depth < MAX_NESTING and entry.get('_type') in ('url', 'url_transparent', 'playlist'):
+                yield from iter_playlist_entries(item_url, depth + 1, is_known, stop_after)
+    finally:
+        # Stops yt-dlp, which would otherwise go on listing pages
+        entries.close()
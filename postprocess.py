@@ -0,0 +1,160 @@
+import base64
+import functools
+import os
+import re
+import shutil
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from engine import EngineError
+
+# Post-processing runs in its own pool, after the download has released its
+# network slot, so ffmpeg work of many jobs overlaps with the next downloads.
+# Merging streams, converting audio and embedding tags and the thumbnail all
+# happen in a single ffmpeg pass, so each file is rewritten only once.
+# Every task runs an ffmpeg process, so a thread per task is enough to keep
+# all cores busy; the pool size is the number of ffmpeg processes at once.
+
+# How each container takes the cover: as an attached picture stream, as a
+# Matroska attachment or, for Ogg, as a METADATA_BLOCK_PICTURE tag
+PICTURE_STREAM_EXTENSIONS = ("mp3", "flac", "m4a", "mp4", "m4v", "mov")
+ATTACHMENT_EXTENSIONS = ("mkv", "mka")
+PICTURE_TAG_EXTENSIONS = ("ogg", "opus")
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+def run_ffmpeg(arguments, output_path):
+    """Runs ffmpeg writing to a temporary file next to output_path, which
+    replaces output_path only once ffmpeg succeeded."""
+    root, ext = os.path.splitext(output_path)
+    temp_path = f"{root}.temp{ext}"
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-nostdin"] + arguments + [temp_path]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        raise EngineError(f"ffmpeg: {e}") from e
+    if result.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise EngineError(f"ffmpeg: {result.stderr.strip() or 'failed'}")
+    os.replace(temp_path, output_path)
+
+def metadata_tags(result):
+    """Tags written for a download, from the engine's download result."""
+    date = result.get('upload_date') or ""
+    tags = {
+        'title': result.get('title'),
+        'artist': result.get('channel') or result.get('uploader'),
+        'date': f"{date[:4]}-{date[4:6]}-{date[6:]}" if len(date) == 8 else date,
+        'description': result.get('description'),
+        'comment': result.get('webpage_url'),
+        'purl': result.get('webpage_url'),
+    }
+    return {key: value for key, value in tags.items() if value}
+
+def picture_block(path):
+    # FLAC picture block (front cover), as Vorbis comments carry it
+    with open(path, 'rb') as f:
+        data = f.read()
+    mime = b"image/jpeg"
+    block = struct.pack(">II", 3, len(mime)) + mime + struct.pack(">I", 0)
+    block += struct.pack(">IIIII", 0, 0, 0, 0, len(data)) + data
+    return base64.b64encode(block).decode("ascii")
+
+def write_ffmetadata(path, tags):
+    # Passed as a file: a cover tag is far longer than a command line allows
+    def escape(value):
+        return re.sub(r"([=;#\\\n])", r"\\\1", str(value))
+
+    with open(path, 'w', encoding="utf-8") as f:
+        f.write(";FFMETADATA1\n")
+        for key, value in tags.items():
+            f.write(f"{escape(key)}={escape(value)}\n")
+
+def finalize_file(inputs, output_path, tags=None, thumbnail=None, audio_args=None, audio_only=False):
+    """Builds the final file in one ffmpeg pass.
+
+    inputs are the downloaded file, or the video and audio stream of a
+    merged format. Streams are copied, except audio when audio_args (an
+    encoder, see formats.AUDIO_TARGETS) is given. tags and the jpg
+    thumbnail are embedded on the way. The inputs and the thumbnail are
+    removed afterwards; output_path may be the same as the only input.
+    """
+    ext = os.path.splitext(output_path)[1][1:]
+    tags = dict(tags or {})
+    if thumbnail and ext in PICTURE_TAG_EXTENSIONS:
+        tags['METADATA_BLOCK_PICTURE'] = picture_block(thumbnail)
+        thumbnail_stream = None
+    else:
+        thumbnail_stream = thumbnail if ext in PICTURE_STREAM_EXTENSIONS else None
+
+    arguments = []
+    for path in inputs:
+        arguments += ["-i", path]
+    audio_input = len(inputs) - 1
+
+    metadata_path = None
+    if tags:
+        metadata_path = f"{os.path.splitext(output_path)[0]}.ffmeta"
+        write_ffmetadata(metadata_path, tags)
+        arguments += ["-f", "ffmetadata", "-i", metadata_path]
+    if thumbnail_stream:
+        arguments += ["-i", thumbnail_stream]
+
+    if audio_only:
+        arguments += ["-map", "0:a:0"]
+    else:
+        arguments += ["-map", "0:v:0", "-map", f"{audio_input}:a:0?"]
+    arguments += ["-c", "copy"] + (audio_args or [])
+
+    if thumbnail_stream:
+        picture = 0 if audio_only else 1
+        arguments += ["-map", f"{len(inputs) + bool(tags)}:v", f"-disposition:v:{picture}", "attached_pic"]
+    elif thumbnail and ext in ATTACHMENT_EXTENSIONS:
+        arguments += [
+            "-attach", thumbnail,
+            "-metadata:s:t", "mimetype=image/jpeg", "-metadata:s:t", "filename=cover.jpg",
+        ]
+    if tags:
+        arguments += ["-map_metadata", str(len(inputs))]
+        if ext in PICTURE_TAG_EXTENSIONS:
+            # Ogg keeps tags on the stream, not the file
+            arguments += ["-map_metadata:s:a", f"{len(inputs)}:g"]
+    else:
+        arguments += ["-map_metadata", "0"]
+    if ext == "mp3":
+        arguments += ["-id3v2_version", "3"]
+
+    try:
+        run_ffmpeg(arguments, output_path)
+    finally:
+        if metadata_path and os.path.exists(metadata_path):
+            os.remove(metadata_path)
+
+    for path in list(inputs) + [thumbnail]:
+        if path and os.path.exists(path) and os.path.abspath(path) != os.path.abspath(output_path):
+            os.remove(path)
+    return output_path
+
+class PostProcessPool:
+    def __init__(self, workers=0):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def submit(self, func, *args):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+        return self._pool.submit(func, *args)
+
+_pool = PostProcessPool()
+
+def configure_postprocess(settings):
+    global _pool
+    settings = settings or {}
+    _pool = PostProcessPool(settings.get("workers", 0))
+    return _pool
+
+def get_postprocess_pool():
+    return _pool
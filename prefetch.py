@@ -0,0 +1,30 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class Prefetcher:
+    """Fetches video information in the background as soon as URLs arrive.
+
+    Results are consumed in submission order with next_ready(), so format
+    tables are usually ready by the time the user gets to them.
+    """
+
+    def __init__(self, workers=3):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._pending = deque()
+
+    def submit(self, url, refresh=False):
+        from download import get_info
+        self._pending.append((url, self._pool.submit(get_info, url, refresh)))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def next_ready(self):
+        # Returns (url, future); the future may still be running
+        return self._pending.popleft()
+
+    def shutdown(self):
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,93 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import threading
+from jsonfile import load_json, save_json
+
+PROBE_FILE = os.path.expanduser("~/.config/YtDownloader/probe.json")
+
+class EnvironmentProbe:
+    """Which yt-dlp is installed, remembered between runs.
+
+    Finding the version means starting `yt-dlp --version`, another Python
+    interpreter, or reading the yt_dlp package metadata, which takes longer
+    than the rest of startup. Answers are kept in a small file together
+    with the location and modification time of the binary or package they
+    describe, and looked up again once that changes, e.g. after an upgrade.
+    """
+
+    def __init__(self, path=PROBE_FILE):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        self._entries = load_json(self.path, "environment cache").get("entries", {})
+
+    def _save(self):
+        save_json(self.path, {"entries": self._entries}, "environment cache", indent=4)
+
+    def _cached(self, key, target, compute):
+        # compute() is trusted for as long as target keeps its mtime
+        try:
+            mtime = os.stat(target).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+            if entry and entry.get("target") == target and entry.get("mtime") == mtime:
+                return entry["value"]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = {"target": target, "mtime": mtime, "value": value}
+            self._save()
+        return value
+
+    def yt_dlp(self, backend):
+        """{'path', 'version'} of the yt_dlp package for the "yt_dlp"
+        backend or of the yt-dlp command for "subprocess", or None if it
+        is not installed."""
+        if backend == "yt_dlp":
+            spec = importlib.util.find_spec("yt_dlp")
+            if spec is None or not spec.origin:
+                return None
+            # A new version replaces the package's files, which updates
+            # the directory's mtime
+            path = os.path.dirname(spec.origin)
+            version = self._cached("yt_dlp", path, package_version)
+        else:
+            path = shutil.which("yt-dlp")
+            if path is None:
+                return None
+            path = os.path.realpath(path)
+            version = self._cached("yt-dlp", path, lambda: command_version(path))
+        return {'path': path, 'version': version}
+
+def package_version():
+    import importlib.metadata
+    try:
+        return importlib.metadata.version("yt-dlp")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+def command_version(path):
+    try:
+        result = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    lines = result.stdout.strip().splitlines()
+    return lines[0] if result.returncode == 0 and lines else None
+
+_probe = None
+
+def get_probe():
+    global _probe
+    if _probe is None:
+        _probe = EnvironmentProbe()
+    return _probe
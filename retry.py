@@ -0,0 +1,150 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+from log import print_warning
+from metrics import get_metrics
+
+TRANSIENT = "transient"
+RATE_LIMITED = "rate_limited"
+PERMANENT = "permanent"
+
+RATE_LIMITED_PATTERN = re.compile(
+    r"HTTP Error 429|Too Many Requests|rate.?limit|Sign in to confirm you.re not a bot",
+    re.IGNORECASE
+)
+PERMANENT_PATTERN = re.compile(
+    r"Private video|Video unavailable|has been removed|account .* terminated"
+    r"|members.only|Join this channel|not available in your country"
+    r"|confirm your age|Unsupported URL|Incomplete YouTube ID|is not a valid URL"
+    r"|HTTP Error 404|HTTP Error 410|Requested format is not available"
+    r"|No video formats found|No space left on device|Permission denied",
+    re.IGNORECASE
+)
+
+# Everything else (5xx, resets, timeouts, DNS hiccups, expired 403 links)
+# is assumed to be worth another try
+def classify_error(message):
+    message = str(message)
+    if RATE_LIMITED_PATTERN.search(message):
+        return RATE_LIMITED
+    if PERMANENT_PATTERN.search(message):
+        return PERMANENT
+    return TRANSIENT
+
+def host_of(url):
+    host = (urlparse(url if "://" in url else f"https://{url}").hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    # youtu.be links hit the same servers and the same limits
+    if host in ("youtu.be", "m.youtube.com", "music.youtube.com"):
+        host = "youtube.com"
+    return host
+
+class CircuitBreaker:
+    """Pauses new requests to a host after a burst of rate-limit errors.
+
+    When `threshold` rate-limited responses arrive within `window` seconds
+    the breaker opens and wait() blocks new requests for `cooldown` seconds.
+    """
+
+    def __init__(self, threshold=5, window=60, cooldown=120, sleep=time.sleep, clock=time.monotonic):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._events = {}
+        self._open_until = {}
+
+    def record(self, host, kind):
+        if kind != RATE_LIMITED:
+            return
+
+        with self._lock:
+            now = self._clock()
+            events = self._events.setdefault(host, deque())
+            events.append(now)
+            while events and now - events[0] > self.window:
+                events.popleft()
+            if len(events) >= self.threshold:
+                self._open_until[host] = now + self.cooldown
+                events.clear()
+                print_warning(f"Too many rate-limit errors from {host}, pausing requests for {self.cooldown}s")
+
+    def wait(self, host):
+        while True:
+            with self._lock:
+                remaining = self._open_until.get(host, 0) - self._clock()
+            if remaining <= 0:
+                return
+            self._sleep(remaining)
+
+class RetryPolicy:
+    def __init__(
+            self,
+            max_attempts=4,
+            base_delay=2,
+            max_delay=60,
+            rate_limit_delay=30,
+            breaker=None,
+            sleep=time.sleep
+        ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_delay = rate_limit_delay
+        self.breaker = breaker or CircuitBreaker(sleep=sleep)
+        self._sleep = sleep
+
+    def backoff(self, attempt, kind):
+        # Full jitter: spreads retries of concurrent jobs instead of having
+        # them all hit the server again at the same moment
+        base = self.rate_limit_delay if kind == RATE_LIMITED else self.base_delay
+        return random.uniform(0, min(self.max_delay, base * 2 ** attempt))
+
+    def call(self, func, url, retry_on, description="request"):
+        """Runs func(), retrying exceptions of type retry_on that classify as
+        transient or rate-limited. Permanent errors are raised immediately."""
+        host = host_of(url)
+        for attempt in range(self.max_attempts):
+            self.breaker.wait(host)
+            try:
+                return func()
+            except retry_on as e:
+                kind = classify_error(e)
+                self.breaker.record(host, kind)
+                if kind == PERMANENT or attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, kind)
+                get_metrics().emit("retry", url=url, kind=kind, description=description)
+                print_warning(
+                    f"{description} failed ({kind.replace('_', '-')}), "
+                    f"retrying in {delay:.1f}s [{attempt + 2}/{self.max_attempts}]"
+                )
+                self._sleep(delay)
+
+_policy = RetryPolicy()
+
+def configure_retry(settings):
+    global _policy
+    settings = settings or {}
+    breaker = CircuitBreaker(
+        threshold=settings.get("breaker_threshold", 5),
+        window=settings.get("breaker_window", 60),
+        cooldown=settings.get("breaker_cooldown", 120),
+    )
+    _policy = RetryPolicy(
+        max_attempts=max(1, settings.get("max_attempts", 4)),
+        base_delay=settings.get("base_delay", 2),
+        max_delay=settings.get("max_delay", 60),
+        rate_limit_delay=settings.get("rate_limit_delay", 30),
+        breaker=breaker,
+    )
+    return _policy
+
+def get_retry_policy():
+    return _policy
@@ -0,0 +1,153 @@
+import json
+import re
+from log import print_cyan, print_error, print_red
+from formats import is_valid_quality
+from urls import is_collection_url, is_valid_youtube_url
+
+# JSON API on top of the download queue, so other programs can drive one
+# resident process instead of starting the script for every download:
+#
+#   POST   /jobs        {"url": ..., "audio": false, "quality": "720", "priority": 0}
+#   GET    /jobs        every job with its state and progress
+#   GET    /jobs/<id>   one job
+#   DELETE /jobs/<id>   cancel a queued job
+#
+# Requests only touch the queue, which runs the lookups and downloads on
+# its own threads with at most queue.max_parallel at once, so a request
+# never waits for yt-dlp.
+
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 64 * 1024
+JOB_PATH = re.compile(r"^/jobs/(\d+)$")
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_submission(body, config):
+    """Validates a POST /jobs body, returning the JobQueue.submit arguments."""
+    try:
+        data = json.loads(body or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ApiError(400, f"Invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ApiError(400, "Expected a JSON object")
+
+    url = data.get("url")
+    if not isinstance(url, str) or not is_valid_youtube_url(url):
+        raise ApiError(400, "'url' must be a youtube video url")
+    if is_collection_url(url):
+        raise ApiError(400, "Playlist and channel urls are not supported, submit their videos")
+
+    content_type = "Audio" if data.get("audio") else "Video"
+    quality = str(data.get("quality") or config[content_type.lower()].get("quality", "best"))
+    if not is_valid_quality(quality):
+        raise ApiError(400, f"Invalid quality '{quality}'")
+    priority = data.get("priority", 0)
+    if not isinstance(priority, int):
+        raise ApiError(400, "'priority' must be an integer")
+
+    return {
+        "url": url,
+        "content_type": content_type,
+        "quality": quality,
+        "priority": priority,
+        "force": bool(data.get("force", False)),
+    }
+
+def make_handler(jobs):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            # read(-1) would wait for the client to close the connection
+            if length < 0:
+                raise ApiError(400, "Invalid Content-Length")
+            if length > MAX_BODY_SIZE:
+                raise ApiError(413, "Request body too large")
+            return self.rfile.read(length)
+
+        def _job_id(self):
+            match = JOB_PATH.match(self.path.split("?")[0])
+            if not match:
+                raise ApiError(404, "Not found")
+            return int(match.group(1))
+
+        def _handle(self, action):
+            try:
+                status, data = action()
+            except ApiError as e:
+                status, data = e.status, {"error": str(e)}
+            except ValueError as e:
+                status, data = 400, {"error": str(e)}
+            self._send_json(status, data)
+
+        def do_GET(self):
+            def action():
+                if self.path.split("?")[0] == "/jobs":
+                    return 200, {"jobs": jobs.status()}
+                status = jobs.status(self._job_id())
+                if status is None:
+                    raise ApiError(404, "No such job")
+                return 200, status
+            self._handle(action)
+
+        def do_POST(self):
+            def action():
+                if self.path.split("?")[0] != "/jobs":
+                    raise ApiError(404, "Not found")
+                job = jobs.submit(**parse_submission(self._read_body(), jobs.config))
+                return 201, job.status_dict()
+            self._handle(action)
+
+        def do_DELETE(self):
+            def action():
+                job_id = self._job_id()
+                if jobs.status(job_id) is None:
+                    raise ApiError(404, "No such job")
+                if not jobs.cancel(job_id):
+                    raise ApiError(409, "Only queued jobs can be cancelled")
+                return 200, jobs.status(job_id)
+            self._handle(action)
+
+    return Handler
+
+def create_server(jobs, host="127.0.0.1", port=DEFAULT_PORT):
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, port), make_handler(jobs))
+    server.daemon_threads = True
+    return server
+
+def serve_main(args, jobs):
+    try:
+        server = create_server(jobs, args.host, args.port)
+    except OSError as e:
+        print_error(f"Cannot listen on {args.host}:{args.port}: {e}")
+        return False
+
+    jobs.start()
+    host, port = server.server_address[:2]
+    print_cyan(f"Serving the download API on http://{host}:{port}/jobs (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        # Unfinished jobs stay in the queue file and resume on the next start
+        print_red("Stopping...")
+    finally:
+        server.server_close()
+    return True
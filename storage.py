@@ -0,0 +1,108 @@
+import os
+import shutil
+import threading
+from formats import format_size, parse_size
+
+# Downloads can go to several directories per content type, e.g. the phone's
+# storage and an SD card. Each download reserves the space its format is
+# expected to take on the directory it is given, before yt-dlp starts, so a
+# batch fails the downloads that cannot fit up front instead of filling the
+# card hours in. Reservations shrink as the download writes its files and
+# are released once it is finished.
+
+# Files that ffmpeg rewrites (merging, converting or embedding) exist twice
+# until the new file replaces the old one
+REWRITE_FACTOR = 2
+
+class StorageError(Exception):
+    pass
+
+class Reservation:
+    def __init__(self, storage, path, device, size):
+        self.storage = storage
+        self.path = path
+        self.device = device
+        self.size = size
+        self._written = {}
+
+    @property
+    def outstanding(self):
+        # Space promised but not yet taken on the disk
+        return max(self.size - sum(self._written.values()), 0)
+
+    def note_progress(self, event):
+        # Each stream reports the bytes of its own part file. The dict is
+        # replaced rather than updated, other threads may be summing it.
+        if event.get('stage') == "download" and event.get('downloaded_bytes'):
+            part_file = event.get('tmpfilename') or event.get('filename')
+            self._written = {**self._written, part_file: event['downloaded_bytes']}
+
+    def release(self):
+        self.storage.release(self)
+
+class Storage:
+    """Places downloads among their target directories.
+
+    A download goes to the directory whose disk has room for it and the
+    fewest downloads writing to it, and among those the one with the most
+    free space left after the other reservations, so concurrent downloads
+    spread over the disks. min_free_space is always kept free. Without
+    check_free_space, downloads are only spread by the number of writers.
+    """
+
+    def __init__(self, min_free_space=0, check_free_space=True):
+        self.min_free_space = min_free_space
+        self.check_free_space = check_free_space
+        self._lock = threading.Lock()
+        self._active = []
+
+    def _headroom(self, path, device):
+        free = shutil.disk_usage(path).free
+        reserved = sum(r.outstanding for r in self._active if r.device == device)
+        return free - reserved - self.min_free_space
+
+    def reserve(self, paths, size, rewrite=False):
+        """Returns a Reservation on the best of paths for a download of
+        about size bytes (0 if unknown), or raises StorageError if none of
+        them has the room."""
+        needed = (size or 0) * (REWRITE_FACTOR if rewrite else 1)
+        with self._lock:
+            candidates = []
+            for path in paths:
+                try:
+                    device = os.stat(path).st_dev
+                    headroom = self._headroom(path, device) if self.check_free_space else 0
+                except OSError:
+                    continue
+                if self.check_free_space and headroom < needed:
+                    continue
+                writers = sum(1 for r in self._active if r.device == device)
+                candidates.append((writers, -headroom, path, device))
+            if not candidates:
+                raise StorageError(
+                    f"Not enough free space for {format_size(needed)} "
+                    f"(keeping {format_size(self.min_free_space)} free) in {', '.join(paths)}"
+                )
+            _, _, path, device = min(candidates)
+            reservation = Reservation(self, path, device, needed)
+            self._active.append(reservation)
+            return reservation
+
+    def release(self, reservation):
+        with self._lock:
+            if reservation in self._active:
+                self._active.remove(reservation)
+
+_storage = Storage()
+
+def configure_storage(settings):
+    global _storage
+    settings = settings or {}
+    _storage = Storage(
+        min_free_space=parse_size(settings.get("min_free_space")) or 0,
+        check_free_space=settings.get("check_free_space", True),
+    )
+    return _storage
+
+def get_storage():
+    return _storage
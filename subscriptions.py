@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from log import print_cyan, print_error, print_green
+from archive import is_archived
+from engine import EngineError
+from formats import is_valid_quality
+from jsonfile import load_json, save_json
+from playlist import iter_playlist_entries
+from urls import canonical_url, canonicalize, is_collection_url, is_valid_youtube_url
+
+SUBSCRIPTIONS_FILE = os.path.expanduser("~/.config/YtDownloader/subscriptions.json")
+
+# A sync lists each subscribed channel or playlist flat and queues only the
+# videos it has not seen before. Channel tabs list the newest uploads
+# first, so their listing stops after stop_after videos in a row that are
+# already known (by ID, or uploaded before the newest upload seen so far)
+# and the older pages are never fetched; only the newest max_known IDs are
+# kept per channel. Playlists can change anywhere, so they are listed in
+# full and all their IDs are kept.
+
+class Subscriptions:
+    def __init__(self, path=SUBSCRIPTIONS_FILE, stop_after=3, max_known=1000):
+        self.path = path
+        self.stop_after = stop_after
+        self.max_known = max_known
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        for entry in load_json(self.path, "subscriptions").get("subscriptions", []):
+            self._entries[entry_key(entry['url'], entry['content_type'])] = entry
+
+    def save(self):
+        with self._lock:
+            save_json(self.path, {"subscriptions": list(self._entries.values())}, "subscriptions")
+
+    def add(self, url, content_type="Video", quality="best", new_only=False):
+        """Subscribes to a channel or playlist. With new_only, the first
+        sync only records the videos already there. Returns (entry, added)."""
+        url = canonical_url(url)
+        key = entry_key(url, content_type)
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key], False
+            kind = canonicalize(url)
+            self._entries[key] = entry = {
+                "url": url,
+                "kind": kind[0] if kind else "channel",
+                "content_type": content_type,
+                "quality": quality,
+                "baseline": new_only,
+                "known": [],
+                "last_upload_date": None,
+                "last_sync": None,
+                "last_new": 0,
+                "added": time.time(),
+            }
+        self.save()
+        return entry, True
+
+    def remove(self, url):
+        url = canonical_url(url)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry['url'] == url]
+            for key in keys:
+                del self._entries[key]
+        if keys:
+            self.save()
+        return len(keys)
+
+    def entries(self):
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda entry: entry['added'])
+
+    def sync(self, entry):
+        """Lists a subscription up to its known videos. Returns (new, seen):
+        the videos not seen before and every video listed. The entry is
+        left alone until record()."""
+        known = set(entry['known'])
+        newest = entry['last_upload_date']
+
+        def is_known(item):
+            date = item['upload_date']
+            return item['id'] in known or bool(newest and date and date < newest)
+
+        stop_after = self.stop_after if entry['kind'] == "channel" else 0
+        seen = list(iter_playlist_entries(entry['url'], is_known=is_known, stop_after=stop_after))
+        return [item for item in seen if item['id'] not in known], seen
+
+    def record(self, entry, new, seen):
+        seen_ids = list(dict.fromkeys(item['id'] for item in seen))
+        if entry['kind'] == "channel":
+            listed = set(seen_ids)
+            known = (seen_ids + [video_id for video_id in entry['known'] if video_id not in listed])
+            known = known[:self.max_known]
+        else:
+            known = seen_ids
+        dates = [item['upload_date'] for item in seen if item['upload_date']]
+        if entry['last_upload_date']:
+            dates.append(entry['last_upload_date'])
+        with self._lock:
+            entry.update(
+                known=known,
+                last_upload_date=max(dates, default=None),
+                last_sync=time.time(),
+                last_new=len(new),
+                baseline=False,
+            )
+
+def entry_key(url, content_type):
+    return f"{content_type.lower()} {url}"
+
+def open_subscriptions(settings):
+    settings = settings or {}
+    return Subscriptions(
+        path=os.path.expanduser(settings.get("path", SUBSCRIPTIONS_FILE)),
+        stop_after=settings.get("stop_after", 3),
+        max_known=settings.get("max_known", 1000),
+    )
+
+def print_subscriptions(subscriptions):
+    entries = subscriptions.entries()
+    if not entries:
+        print("No subscriptions yet")
+        return
+    lines = ["—" * 60]
+    for entry in entries:
+        synced = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry['last_sync'])) if entry['last_sync'] else "never"
+        lines.append(f"{entry['kind']:<8} {entry['content_type']:<6} {entry['quality']:<10} "
+                     f"{len(entry['known']):>5} known, {entry['last_new']:>3} new at {synced:<16} "
+                     f"{entry['url']}")
+    lines.append("—" * 60)
+    print("\n".join(lines))
+
+def subscribe_main(args, config):
+    subscriptions = open_subscriptions(config.get('subscriptions'))
+
+    if args.subscribe_command == "add":
+        content_type = "Audio" if args.audio else "Video"
+        quality = args.quality or config[content_type.lower()].get("quality", "best")
+        if not is_valid_quality(quality):
+            print_error(f"Invalid quality '{quality}': use best, worst, a number or a quality policy")
+            return False
+        ok = True
+        for url in args.urls:
+            if not is_valid_youtube_url(url) or not is_collection_url(url):
+                print_error(f"'{url}' Is not a youtube channel or playlist url")
+                ok = False
+                continue
+            entry, added = subscriptions.add(url, content_type, quality, new_only=args.new_only)
+            if added:
+                print_cyan(f"Subscribed to {entry['url']} ({content_type.lower()}, {quality})")
+            else:
+                print_cyan(f"Already subscribed to {entry['url']}")
+        return ok
+
+    if args.subscribe_command == "list":
+        print_subscriptions(subscriptions)
+        return True
+
+    ok = True
+    for url in args.urls:
+        if not subscriptions.remove(url):
+            print_error(f"Not subscribed to {url}")
+            ok = False
+    return ok
+
+def sync_main(args, config, submit):
+    """Lists every subscription and hands the URLs of its new videos to
+    submit(urls, content_type, quality), oldest first."""
+    settings = config.get('subscriptions', {})
+    subscriptions = open_subscriptions(settings)
+    entries = subscriptions.entries()
+    if not entries:
+        print("No subscriptions yet, add one with: subscribe add URL")
+        return True
+
+    started = time.monotonic()
+    ok = True
+    queued = 0
+    pool = ThreadPoolExecutor(max_workers=args.workers or settings.get("workers", 8), thread_name_prefix="sync")
+    futures = {pool.submit(subscriptions.sync, entry): entry for entry in entries}
+    try:
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                new, seen = future.result()
+            except EngineError as e:
+                print_error(f"Failed to list {entry['url']}: {e}")
+                ok = False
+                continue
+
+            if entry['baseline']:
+                print_cyan(f"{entry['url']}: recorded {len(seen)} existing videos")
+            elif new:
+                # Channels list the newest first
+                ordered = reversed(new) if entry['kind'] == "channel" else new
+                urls = [item['url'] for item in ordered if not is_archived(item['url'], entry['content_type'])]
+                if urls:
+                    submit(urls, entry['content_type'], entry['quality'])
+                    queued += len(urls)
+                print_cyan(f"{entry['url']}: {len(new)} new")
+            subscriptions.record(entry, new, seen)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        # What was listed is kept even if the sync is interrupted
+        subscriptions.save()
+
+    print_green(f"Synced {len(entries)} subscriptions in {time.monotonic() - started:.1f}s, "
+                f"{queued} new videos queued")
+    return ok
@@ -0,0 +1,95 @@
+"""Retry policy and circuit breaker against failures injected into the fake
+engine. Sleeping is simulated, so these run instantly.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from engine import EngineError
+from fake_engine import FakeEngine, PERMANENT_ERRORS, RATE_LIMITED_ERRORS, TRANSIENT_ERRORS
+from retry import PERMANENT, RATE_LIMITED, TRANSIENT, CircuitBreaker, RetryPolicy, classify_error
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+    def __call__(self):
+        return self.now
+
+def make_policy(clock, threshold=3, max_attempts=4):
+    breaker = CircuitBreaker(threshold=threshold, window=60, cooldown=120,
+                             sleep=clock.sleep, clock=clock)
+    return RetryPolicy(max_attempts=max_attempts, base_delay=2, max_delay=60,
+                       rate_limit_delay=30, breaker=breaker, sleep=clock.sleep)
+
+def fetch(engine, policy, url):
+    try:
+        policy.call(lambda: engine.extract_info(url), url, EngineError, "Fetching information")
+        return True
+    except EngineError:
+        return False
+
+@pytest.mark.parametrize("kind, message", [
+    *((TRANSIENT, message) for message in TRANSIENT_ERRORS),
+    *((RATE_LIMITED, message) for message in RATE_LIMITED_ERRORS),
+    *((PERMANENT, message) for message in PERMANENT_ERRORS),
+])
+def test_classify_error(kind, message):
+    assert classify_error(message) == kind
+
+@pytest.mark.parametrize("errors, threshold, succeeds, attempts", [
+    (TRANSIENT_ERRORS[:2], 3, True, 3),
+    (TRANSIENT_ERRORS * 2, 3, False, 4),
+    (RATE_LIMITED_ERRORS[:1], 10, True, 2),
+    (PERMANENT_ERRORS[:1], 3, False, 1),
+], ids=["transient then success", "transient beyond max attempts",
+        "rate-limited then success", "permanent fails at once"])
+def test_retries(errors, threshold, succeeds, attempts):
+    clock = SimulatedClock()
+    engine = FakeEngine()
+    engine.inject(URL, *errors)
+
+    assert fetch(engine, make_policy(clock, threshold), URL) is succeeds
+    assert len(engine.calls) == attempts
+
+def test_breaker_pauses_host_after_rate_limit_burst():
+    # Several jobs hitting 429s in a row open the breaker, so the next
+    # request to the host waits out the cooldown first
+    clock = SimulatedClock()
+    policy = make_policy(clock, threshold=3, max_attempts=1)
+    engine = FakeEngine()
+    urls = [f"https://youtu.be/{i:011d}" for i in range(3)]
+    for url in urls:
+        engine.inject(url, RATE_LIMITED_ERRORS[0])
+    for url in urls:
+        assert not fetch(engine, policy, url)
+
+    before = clock.slept
+    assert fetch(engine, policy, "https://www.youtube.com/watch?v=zzzzzzzzzzz")
+    assert clock.slept - before >= 119
+
+def test_breaker_stays_closed_below_threshold():
+    clock = SimulatedClock()
+    policy = make_policy(clock, threshold=3, max_attempts=1)
+    engine = FakeEngine()
+    engine.inject(URL, RATE_LIMITED_ERRORS[0])
+    assert not fetch(engine, policy, URL)
+
+    before = clock.slept
+    assert fetch(engine, policy, "https://www.youtube.com/watch?v=zzzzzzzzzzz")
+    assert clock.slept == before
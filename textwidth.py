@@ -0,0 +1,64 @@
+from bisect import bisect_right
+from itertools import accumulate
+
+# Terminal column widths of text, for lining up boxes, tables and the
+# dashboard. CJK characters and most emoji take two columns, combining
+# marks and control characters none.
+#
+# Plain ASCII, most titles and every URL, is measured with len(). Other
+# text is looked up one character at a time in a table filled from
+# wcwidth as characters are first seen, so a playlist of thousands of
+# titles in the same script asks wcwidth about each character only once.
+
+class _WidthTable(dict):
+    def __missing__(self, char):
+        # Only needed once non-ASCII text shows up
+        import wcwidth
+        width = max(wcwidth.wcwidth(char), 0)
+        self[char] = width
+        return width
+
+_widths = _WidthTable()
+
+def _is_plain(text):
+    # isascii() is a flag check; isprintable() rules out tabs and escapes
+    return text.isascii() and text.isprintable()
+
+def display_width(text):
+    text = str(text)
+    if _is_plain(text):
+        return len(text)
+    return sum(map(_widths.__getitem__, text))
+
+def fit(text, max_width, ellipsis="..."):
+    """Cuts text to at most max_width columns, ending it with ellipsis if
+    anything was cut. Returns (text, width), measured in the same pass."""
+    text = str(text)
+    if _is_plain(text):
+        if len(text) <= max_width:
+            return text, len(text)
+        cut = max(max_width - len(ellipsis), 0)
+        return text[:cut] + ellipsis, cut + len(ellipsis)
+
+    # The per-character widths are looked up once and used both to measure
+    # the text and, if it does not fit, to find where to cut it. Only
+    # zero-width characters (combining marks) let more than max_width + 1
+    # characters fit, so usually only that many are looked at.
+    widths = list(map(_widths.__getitem__, text[:max_width + 1]))
+    width = sum(widths)
+    if width <= max_width:
+        if len(text) <= max_width + 1:
+            return text, width
+        widths += map(_widths.__getitem__, text[max_width + 1:])
+        width = sum(widths)
+        if width <= max_width:
+            return text, width
+    ellipsis_width = display_width(ellipsis)
+    ends = list(accumulate(widths))
+    cut = bisect_right(ends, max(max_width - ellipsis_width, 0))
+    return text[:cut] + ellipsis, (ends[cut - 1] if cut else 0) + ellipsis_width
+
+def pad(text, width):
+    """text cut or padded with spaces to exactly width columns."""
+    text, used = fit(text, width, "…")
+    return text + " " * (width - used)
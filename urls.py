@@ -0,0 +1,72 @@
+import re
+
+# Every spelling of a YouTube link that names one video, playlist or
+# channel, as (kind, marker, pattern). The marker is a plain substring
+# checked first, so most URLs only run the one regex that can match them.
+# The first group of each pattern is the ID.
+_HOST = r"^(?:https?://)?(?:www\.|m\.|music\.)?youtube\.com/"
+URL_PATTERNS = (
+    # watch?v=ID, with v anywhere in the query
+    ("video", "watch?", re.compile(_HOST + r"watch\?(?:[^#]*&)?v=([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])")),
+    # youtu.be/ID
+    ("video", "youtu.be/", re.compile(r"^(?:https?://)?(?:www\.)?youtu\.be/([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])")),
+    # shorts/ID, embed/ID, v/ID, live/ID
+    ("video", "youtube.com/", re.compile(_HOST + r"(?:shorts|embed|v|live)/([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])")),
+    # playlist?list=ID
+    ("playlist", "list=", re.compile(_HOST + r"playlist\?(?:[^#]*&)?list=([A-Za-z0-9_-]+)")),
+    # channel/ID, c/name, user/name, @handle
+    ("channel", "youtube.com/", re.compile(_HOST + r"((?:channel|c|user)/[A-Za-z0-9_-]+|@[A-Za-z0-9_.-]+)")),
+)
+
+CANONICAL_URLS = {
+    "video": "https://www.youtube.com/watch?v={}",
+    "playlist": "https://www.youtube.com/playlist?list={}",
+}
+
+VALID_URL_PATTERN = re.compile(
+    r"^(https?://)?(www\.)?"
+    r"(youtube\.com/(watch\?v=|embed/|v/|shorts/"
+    r"|playlist\?list=|user/|c/|channel/)|youtu\.be/)"
+    r"[A-Za-z0-9_-]+"
+    r"([?&][A-Za-z0-9_=-]+)*$"
+)
+
+def canonicalize(url):
+    """Returns (kind, id) for a YouTube URL, kind being "video",
+    "playlist" or "channel", or None if it is not one."""
+    if not url:
+        return None
+    for kind, marker, pattern in URL_PATTERNS:
+        if marker in url:
+            match = pattern.match(url)
+            if match:
+                return kind, match.group(1)
+    return None
+
+def canonical_url(url):
+    """One spelling per video or playlist, so duplicates compare equal.
+    Other URLs are returned unchanged."""
+    key = canonicalize(url)
+    if key is None or key[0] not in CANONICAL_URLS:
+        return url
+    return CANONICAL_URLS[key[0]].format(key[1])
+
+def extract_video_id(url):
+    key = canonicalize(url)
+    return key[1] if key and key[0] == "video" else None
+
+def is_valid_youtube_url(url):
+    if not url:
+        return False
+    return VALID_URL_PATTERN.match(url) is not None
+
+COLLECTION_PATTERN = re.compile(
+    r"youtube\.com/(playlist\?list=|channel/|c/|user/)"
+)
+
+# Playlist and channel URLs are expanded entry by entry instead of being
+# fetched as one huge info dict
+def is_collection_url(url):
+    if not url:
+        return False
+    return COLLECTION_PATTERN.search(url) is not None
@@ -0,0 +1,203 @@
+import os
+import socket
+import threading
+from log import print_cyan, print_error, print_red, print_warning
+from archive import is_archived
+from cache import get_cache
+from formats import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, is_valid_quality
+from jobs import DONE, DOWNLOADING, FAILED, FETCHING
+from jobstore import open_job_store
+from loading import get_dashboard
+from urls import canonical_url, is_collection_url, is_valid_youtube_url
+
+class Worker:
+    """Downloads jobs from a shared job store, concurrency at a time.
+
+    Each slot claims a job, keeps its lease alive with heartbeats and runs
+    the same lookup, format choice and download as the local queue. Jobs of
+    a worker that dies are claimed again by the others once their lease
+    expires; partial files on shared storage are continued by yt-dlp.
+    """
+
+    def __init__(self, store, config, concurrency=2, poll_interval=5, name=None):
+        self.store = store
+        self.config = config
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        # Job id held by each slot, returned to the store on Ctrl-C
+        self._held = {}
+
+    def run(self, drain=False):
+        """Works until interrupted or, with drain, until the store has no
+        queued or running jobs left."""
+        slots = [
+            threading.Thread(target=self._slot, args=(f"{self.name}/{index}", drain),
+                             name="worker", daemon=True)
+            for index in range(self.concurrency)
+        ]
+        dashboard = get_dashboard()
+        dashboard.start()
+        try:
+            for slot in slots:
+                slot.start()
+            for slot in slots:
+                # Joined with a timeout so Ctrl-C is noticed
+                while slot.is_alive():
+                    slot.join(0.5)
+        except KeyboardInterrupt:
+            self._stopping.set()
+            with self._lock:
+                held = list(self._held.items())
+            for slot_name, job_id in held:
+                self.store.release(job_id, slot_name)
+            print_red(f"Stopped, {len(held)} job(s) returned to the queue")
+            # os._exit skips the atexit handler that saves the cache
+            get_cache().save()
+            os._exit(130)
+        finally:
+            dashboard.stop()
+
+    def _slot(self, slot_name, drain):
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim(slot_name)
+                if job is None:
+                    if drain and self.store.pending_count() == 0:
+                        return
+                    self._stopping.wait(self.poll_interval)
+                    continue
+            except Exception as e:
+                # The store may be briefly unreachable on network storage
+                print_error(f"Job store: {e}")
+                self._stopping.wait(self.poll_interval)
+                continue
+            self._work(slot_name, job)
+
+    def _heartbeat(self, slot_name, job, done):
+        interval = max(self.store.lease / 3, 1)
+        while not done.wait(interval):
+            try:
+                if not self.store.heartbeat(job['id'], slot_name):
+                    print_warning(f"Lost the lease on #{job['id']}, another worker may take it over")
+                    return
+            except Exception as e:
+                print_error(f"Job store: {e}")
+
+    def _work(self, slot_name, job):
+        from download import download_content, get_best_formats, get_info, select_format
+
+        url = job['url']
+        content_type = job['content_type']
+        is_audio = content_type == "Audio"
+        with self._lock:
+            self._held[slot_name] = job['id']
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(slot_name, job, done), daemon=True).start()
+
+        task = get_dashboard().add(f"#{job['id']} {url}", stage=FETCHING)
+        state, error = FAILED, None
+        try:
+            if job['attempts'] > 1:
+                print_cyan(f"Taking over #{job['id']} {url} (attempt {job['attempts']})")
+            if not job['force'] and is_archived(url, content_type):
+                state, error = DONE, "already downloaded"
+                return
+
+            info = get_info(url)
+            if not info:
+                error = "failed to get information"
+                return
+            extensions = AUDIO_EXTENSIONS if is_audio else VIDEO_EXTENSIONS
+            formats = get_best_formats(info.get('formats', []), extensions, is_audio=is_audio)
+            target_codec = self.config['audio'].get("target_codec", "") if is_audio else ""
+            selected = select_format(formats, job['quality'], is_audio, target_codec)
+            if selected is None:
+                error = "no suitable formats"
+                return
+
+            self.store.set_state(job['id'], slot_name, DOWNLOADING)
+            task.set_label(f"#{job['id']} {info.get('title') or url}")
+            task.set_stage(DOWNLOADING)
+            section = self.config['audio' if is_audio else 'video']
+            # The store brings interrupted jobs back, not the journal
+            ok = download_content(
+                url, selected, content_type, section, quiet=True, progress=task, journal=False,
+                download_path=job['download_path'],
+                placed=lambda path: self.store.set_download_path(job['id'], slot_name, path)
+            )
+            state, error = (DONE, None) if ok else (FAILED, "download failed")
+        except Exception as e:
+            error = str(e)
+        finally:
+            done.set()
+            with self._lock:
+                self._held.pop(slot_name, None)
+            try:
+                self.store.finish(job['id'], slot_name, state, error)
+            except Exception as e:
+                print_error(f"Job store: {e}")
+            task.finish(state)
+
+def print_store_jobs(store):
+    jobs = store.jobs()
+    if not jobs:
+        print("No shared downloads yet")
+        return
+    lines = ["—" * 60]
+    for job in jobs:
+        detail = job['error'] or (job['worker'] if job['state'] not in (DONE, FAILED) else "") or ""
+        lines.append(f"#{job['id']:<4} {job['state']:<15} {job['content_type']:<6} p{job['priority']:<3} "
+                     f"{job['quality']:<16} {job['url']} {detail}")
+    lines.append("—" * 60)
+    print("\n".join(lines))
+
+def shared_queue_main(args, config):
+    """queue add/list/cancel --shared, on the shared job store."""
+    store = open_job_store(config.get('worker'))
+
+    if args.queue_command == "add":
+        content_type = "Audio" if args.audio else "Video"
+        quality = args.quality or config[content_type.lower()].get("quality", "best")
+        if not is_valid_quality(quality):
+            print_error(f"Invalid quality '{quality}': use best, worst, a number or a quality policy")
+            return False
+        ok = True
+        for url in args.urls:
+            if not is_valid_youtube_url(url) or is_collection_url(url):
+                print_error(f"'{url}' Is not a valid youtube video url")
+                ok = False
+                continue
+            url = canonical_url(url)
+            job_id, added = store.add(url, content_type, quality, args.priority)
+            if added:
+                print_cyan(f"Queued shared download #{job_id}: {url} ({quality})")
+            else:
+                print_cyan(f"{url} is already queued as #{job_id}")
+        return ok
+
+    if args.queue_command == "list":
+        print_store_jobs(store)
+        return True
+
+    ok = True
+    for job_id in args.ids:
+        if not store.cancel(job_id):
+            print_error(f"Download #{job_id} is not queued")
+            ok = False
+    return ok
+
+def worker_main(args, config):
+    settings = config.get('worker', {})
+    store = open_job_store(settings)
+    worker = Worker(
+        store,
+        config,
+        concurrency=args.concurrency or settings.get("concurrency", 2),
+        poll_interval=settings.get("poll_interval", 5),
+    )
+    print_cyan(f"Worker {worker.name} taking jobs from {store.path} ({worker.concurrency} at a time)")
+    worker.run(drain=args.drain)
+    return True